@@ -1,2 +1,3 @@
 #!/bin/sh
+FLASK_APP=./volume_provider/app.py python -m flask create-indexes || echo "Could not create some MongoDB indexes, see the errors above"
 gunicorn --bind 0.0.0.0:5020 --worker-class gevent --workers 10 --log-file - volume_provider.app:app
@@ -1,16 +1,23 @@
 import json
 import logging
+from time import time
 from traceback import print_exc
 from bson import json_util
-from flask import Flask, request, jsonify, make_response
+import click
+from flask import Flask, request, jsonify, make_response, g
 from raven.contrib.flask import Sentry
 from flask_cors import CORS
 from flask_httpauth import HTTPBasicAuth
-from mongoengine import connect
+from mongoengine import connect, ValidationError
 from volume_provider.settings import APP_USERNAME, APP_PASSWORD, MONGODB_PARAMS, MONGODB_DB, LOGGING_LEVEL, SENTRY_DSN
-from volume_provider.providers import get_provider_to
+from volume_provider.settings import SNAPSHOT_PAGE_SIZE, SNAPSHOT_PAGE_MAX_SIZE
+from volume_provider.providers import get_provider_to, ProviderGce
 from dbaas_base_provider.log import log_this
-from volume_provider.models import Snapshot
+from volume_provider.models import (
+    Volume, Snapshot, Operation, create_indexes, VOLUME_JSON_FIELDS
+)
+from volume_provider.credentials.base import CredentialBase
+from volume_provider.utils import metrics, operations
 
 app = Flask(__name__)
 auth = HTTPBasicAuth()
@@ -35,7 +42,27 @@ def verify_password(username, password):
 
 def build_provider(provider_name, env):
     provider_cls = get_provider_to(provider_name)
-    return provider_cls(env, dict(request.headers))
+    provider = provider_cls(env, dict(request.headers))
+    g.setdefault('providers', []).append(provider)
+    return provider
+
+
+@app.teardown_request
+def release_providers(exception=None):
+    for provider in g.pop('providers', []):
+        provider.release()
+
+
+def is_async():
+    return bool(int(request.args.get("async", "0")))
+
+
+def start_operation(provider, action, call, serializer=None, *args, **kwargs):
+    operation = operations.start(provider, action, call, serializer, *args, **kwargs)
+    g.providers.remove(provider)
+    return response_created(
+        status_code=202, operation_id=operation.uuid, status=operation.status
+    )
 
 
 @app.route("/<string:provider_name>/<string:env>/credential/new", methods=["POST"])
@@ -101,7 +128,7 @@ def update_credential(provider_name, env):
 def destroy_credential(provider_name, env):
     try:
         provider = build_provider(provider_name, env)
-        deleted = provider.credential.delete()
+        deleted = provider.credential_delete()
     except Exception as e:
         print_exc()  # TODO Improve log
         return response_invalid_request(str(e))
@@ -124,11 +151,15 @@ def create_volume(provider_name, env):
 
     try:
         provider = build_provider(provider_name, env)
+        if is_async():
+            return start_operation(
+                provider, "create_volume", provider.create_volume, _volume_json, **data
+            )
         volume = provider.create_volume(**data)
     except Exception as e:  # TODO What can get wrong here?
         print_exc()  # TODO Improve log
         return response_invalid_request(str(e))
-    return response_created(identifier=volume.identifier)
+    return response_created(**_volume_json(volume))
 
 
 @app.route("/<string:provider_name>/<string:env>/volume/<string:identifier>", methods=["DELETE"])
@@ -155,6 +186,10 @@ def move_volume(provider_name, env, identifier):
         return response_invalid_request("Invalid zone")
     try:
         provider = build_provider(provider_name, env)
+        if is_async():
+            return start_operation(
+                provider, "move_volume", provider.move_volume, None, identifier, zone
+            )
         provider.move_volume(identifier, zone)
     except Exception as e:  # TODO What can get wrong here?
         print_exc()  # TODO Improve log
@@ -166,16 +201,66 @@ def move_volume(provider_name, env, identifier):
 @auth.login_required
 @log_this
 def get_volume(provider_name, env, identifier_or_path):
+    fields = VOLUME_JSON_FIELDS
+    if request.args.get("fields"):
+        fields = tuple(request.args["fields"].split(","))
+        invalid = [field for field in fields if field == "id" or field not in Volume._fields]
+        if invalid:
+            return response_invalid_request(
+                "Invalid fields: {}".format(", ".join(invalid)), status_code=400
+            )
+
     try:
         provider = build_provider(provider_name, env)
     except Exception as e:  # TODO What can get wrong here?
         print_exc()  # TODO Improve log
         return response_invalid_request(str(e))
 
-    volume = provider.get_volume(identifier_or_path)
+    volume = provider.get_volume_data(identifier_or_path, fields)
     if not volume:
         return response_not_found(identifier_or_path)
-    return response_ok(**volume.get_json)
+    return response_ok(**volume)
+
+
+@app.route(
+    "/<string:provider_name>/<string:env>/volume/<string:identifier>/snapshots", methods=["GET"]
+)
+@auth.login_required
+@log_this
+def list_snapshots(provider_name, env, identifier):
+    cursor = request.args.get("cursor")
+    try:
+        limit = int(request.args.get("limit", SNAPSHOT_PAGE_SIZE))
+    except ValueError:
+        return response_invalid_request("Invalid limit", status_code=400)
+    if not 0 < limit <= SNAPSHOT_PAGE_MAX_SIZE:
+        return response_invalid_request("Invalid limit", status_code=400)
+
+    try:
+        provider = build_provider(provider_name, env)
+        snapshots, next_cursor = provider.list_snapshots(identifier, limit, cursor)
+    except Volume.DoesNotExist:
+        return response_not_found(identifier)
+    except ValueError as e:
+        return response_invalid_request(str(e), status_code=400)
+    except Exception as e:  # TODO What can get wrong here?
+        print_exc()  # TODO Improve log
+        return response_invalid_request(str(e))
+    return response_ok(
+        snapshots=[_snapshot_list_json(snapshot) for snapshot in snapshots],
+        next_cursor=next_cursor
+    )
+
+
+def _snapshot_list_json(snapshot):
+    return {
+        'identifier': snapshot.identifier,
+        'description': snapshot.description,
+        'created_at': snapshot.created_at,
+        'size': snapshot.size_bytes,
+        'status': snapshot.status,
+        'download_bytes': snapshot.download_bytes,
+    }
 
 
 @app.route("/<string:provider_name>/<string:env>/access/<string:identifier>", methods=["POST"])
@@ -223,6 +308,10 @@ def resize_volume(provider_name, env, identifier):
 
     try:
         provider = build_provider(provider_name, env)
+        if is_async():
+            return start_operation(
+                provider, "resize", provider.resize, None, identifier, new_size_kb
+            )
         provider.resize(identifier, new_size_kb)
     except Exception as e:  # TODO What can get wrong here?
         print_exc()  # TODO Improve log
@@ -241,16 +330,54 @@ def take_snapshot(provider_name, env, identifier):
     persist = bool(int(request.args.get("persist", "0")))
     try:
         provider = build_provider(provider_name, env)
+        if is_async():
+            return start_operation(
+                provider, "take_snapshot", provider.take_snapshot, _snapshot_json,
+                identifier, team_name, engine, db_name, persist
+            )
         snapshot = provider.take_snapshot(identifier, team_name, engine, db_name, persist)
     except Exception as e:  # TODO What can get wrong here?
         print_exc()  # TODO Improve log
         return response_invalid_request(str(e))
-    return response_created(
-        identifier=snapshot.identifier,
-        description=snapshot.description,
-        volume_path=snapshot.volume.path,
-        size=snapshot.size_bytes,
-    )
+    return response_created(**_snapshot_json(snapshot))
+
+
+@app.route("/<string:provider_name>/<string:env>/snapshots/bulk", methods=["POST"])
+@auth.login_required
+@log_this
+def take_snapshots(provider_name, env):
+    data = request.get_json() or {}
+    identifiers = data.get("identifiers")
+    group = data.get("group")
+    vm_name = data.get("vm_name")
+    engine = data.get("engine", None)
+    team_name = data.get("team_name", None)
+    db_name = data.get("db_name", None)
+    persist = bool(int(request.args.get("persist", "0")))
+
+    if identifiers is not None and not _valid_identifiers(identifiers):
+        return response_invalid_request(
+            "identifiers must be a non-empty list of strings", status_code=400
+        )
+    if not (identifiers or group or vm_name):
+        return response_invalid_request("Invalid data {}".format(data))
+    try:
+        provider = build_provider(provider_name, env)
+        if not identifiers:
+            filters = {"group": group} if group else {"vm_name": vm_name}
+            identifiers = provider.load_identifiers(**filters)
+        if not identifiers:
+            return response_not_found(group or vm_name)
+        if is_async():
+            return start_operation(
+                provider, "take_snapshots", provider.take_snapshots, _bulk_snapshot_json,
+                identifiers, team_name, engine, db_name, persist
+            )
+        results = provider.take_snapshots(identifiers, team_name, engine, db_name, persist)
+    except Exception as e:  # TODO What can get wrong here?
+        print_exc()  # TODO Improve log
+        return response_invalid_request(str(e))
+    return response_created(**_bulk_snapshot_json(results))
 
 
 @app.route("/<string:provider_name>/<string:env>/gcp/snapshot/<string:identifier>", methods=["POST"])
@@ -264,18 +391,21 @@ def new_take_snapshot(provider_name, env, identifier):
     persist = bool(int(request.args.get("persist", "0")))
     try:
         provider = build_provider(provider_name, env)
+        if is_async():
+            return start_operation(
+                provider, "new_take_snapshot", provider.new_take_snapshot, _new_snapshot_json,
+                identifier, team_name, engine, db_name, persist
+            )
         snapshot = provider.new_take_snapshot(identifier, team_name, engine, db_name, persist)
     except Exception as e:  # TODO What can get wrong here?
         print_exc()  # TODO Improve log
         return response_invalid_request(str(e))
-    return response_created(
-        identifier=snapshot.identifier,
-        description=snapshot.description,
-        volume_path=snapshot.volume.path,
-    )
+    return response_created(**_new_snapshot_json(snapshot))
 
 
-@app.route("/<string:provider_name>/<string:env>/snapshot/<string:identifier>/state", methods=["GET"])
+@app.route(
+    "/<string:provider_name>/<string:env>/snapshot/<string:identifier>/state", methods=["GET"]
+)
 @auth.login_required
 @log_this
 def get_snapshot_status(provider_name, env, identifier):
@@ -286,20 +416,49 @@ def get_snapshot_status(provider_name, env, identifier):
         print_exc()  # TODO Improve log
         return response_invalid_request(str(e))
 
-    if state['code'] in [404, 408, 500]:
-        return response_created(status_code=state['code'], identifier=identifier, error=state['message'])
+    return response_created(
+        status_code=state['code'], **_snapshot_state_json(identifier, state, snap)
+    )
 
-    if state['code'] == 200:
-        return response_created(
-            status_code=state['code'], identifier=state['id'], database_name=state['db'], snapshot_status=state['status'],
-            volume_path=snap.volume.path, size=state['size'], description=snap.description
-        )
-    else:
-        return response_created(
-            status_code=state['code'], identifier=state['id'], database_name=state['db'],
-            snapshot_status=state['status'],
-            volume_path=snap.volume.path, description=snap.description
+
+@app.route("/<string:provider_name>/<string:env>/snapshots/state", methods=["POST"])
+@auth.login_required
+@log_this
+def get_snapshots_status(provider_name, env):
+    data = request.get_json() or {}
+    identifiers = data.get("identifiers")
+
+    if not _valid_identifiers(identifiers):
+        return response_invalid_request(
+            "identifiers must be a non-empty list of strings", status_code=400
         )
+    try:
+        provider = build_provider(provider_name, env)
+        results = provider.get_snapshots_status(identifiers)
+    except Exception as e:  # TODO What can get wrong here?
+        print_exc()  # TODO Improve log
+        return response_invalid_request(str(e))
+
+    return response_ok(snapshots=[
+        dict(_snapshot_state_json(identifier, state, snap), status_code=state['code'])
+        for identifier, state, snap in results
+    ])
+
+
+def _snapshot_state_json(identifier, state, snap):
+    if state['code'] in [404, 408, 500]:
+        return {'identifier': identifier, 'error': str(state['message'])}
+
+    content = {
+        'identifier': state['id'],
+        'database_name': state['db'],
+        'snapshot_status': state['status'],
+        'volume_path': snap.volume.path,
+        'description': snap.description,
+    }
+    if state['code'] == 200:
+        content['size'] = state['size']
+    return content
 
 
 @app.route("/<string:provider_name>/<string:env>/snapshot/<string:identifier>", methods=["DELETE"])
@@ -320,7 +479,28 @@ def remove_snapshot(provider_name, env, identifier):
     return response_ok(removed=removed)
 
 
-@app.route("/<string:provider_name>/<string:env>/snapshot/<string:identifier>/restore", methods=["POST"])
+@app.route(
+    "/<string:provider_name>/<string:env>/snapshots/group/<string:group>", methods=["DELETE"]
+)
+@auth.login_required
+@log_this
+def remove_all_snapshots(provider_name, env, group):
+    try:
+        provider = build_provider(provider_name, env)
+        if is_async():
+            return start_operation(
+                provider, "remove_all_snapshots", provider.remove_all_snapshots, dict, group
+            )
+        summary = provider.remove_all_snapshots(group)
+    except Exception as e:  # TODO What can get wrong here?
+        print_exc()  # TODO Improve log
+        return response_invalid_request(str(e))
+    return response_ok(**summary)
+
+
+@app.route(
+    "/<string:provider_name>/<string:env>/snapshot/<string:identifier>/restore", methods=["POST"]
+)
 @auth.login_required
 @log_this
 def restore_snapshot(provider_name, env, identifier):
@@ -334,6 +514,12 @@ def restore_snapshot(provider_name, env, identifier):
 
     try:
         provider = build_provider(provider_name, env)
+        if is_async():
+            return start_operation(
+                provider, "restore_snapshot", provider.restore_snapshot, _volume_json,
+                identifier, destination_zone, destination_vm_name,
+                engine, team_name, db_name, disk_offering_type
+            )
         volume = provider.restore_snapshot(
             identifier, destination_zone, destination_vm_name,
             engine, team_name, db_name, disk_offering_type
@@ -341,7 +527,7 @@ def restore_snapshot(provider_name, env, identifier):
     except Exception as e:  # TODO What can get wrong here?
         print_exc()  # TODO Improve log
         return response_invalid_request(str(e))
-    return response_created(identifier=volume.identifier)
+    return response_created(**_volume_json(volume))
 
 
 @app.route("/<string:provider_name>/<string:env>/commands/<string:identifier>/mount", methods=["POST"])
@@ -376,6 +562,11 @@ def attach_volume(provider_name, env, identifier):
 
     try:
         provider = build_provider(provider_name, env)
+        if is_async():
+            return start_operation(
+                provider, "attach_disk", provider.attach_disk, None,
+                identifier, host_vm=host_vm, host_zone=host_zone
+            )
         provider.attach_disk(identifier, host_vm=host_vm, host_zone=host_zone)
     except Exception as e:  # TODO What can get wrong here?
         print_exc()  # TODO Improve log
@@ -391,6 +582,10 @@ def detach_volume(provider_name, env, identifier):
 
     try:
         provider = build_provider(provider_name, env)
+        if is_async():
+            return start_operation(
+                provider, "detach_disk", provider.detach_disk, None, identifier
+            )
         provider.detach_disk(identifier)
     except Exception as e:  # TODO What can get wrong here?
         print_exc()  # TODO Improve log
@@ -398,7 +593,10 @@ def detach_volume(provider_name, env, identifier):
     return response_ok()
 
 
-@app.route("/<string:provider_name>/<string:env>/snapshots/<string:identifier>/commands/scp", methods=["GET"])
+@app.route(
+    "/<string:provider_name>/<string:env>/snapshots/<string:identifier>/commands/scp",
+    methods=["GET"]
+)
 @auth.login_required
 @log_this
 def command_scp_from_snap(provider_name, env, identifier):
@@ -418,7 +616,10 @@ def command_scp_from_snap(provider_name, env, identifier):
     return response_ok(command=command)
 
 
-@app.route("/<string:provider_name>/<string:env>/snapshots/<string:identifier>/commands/rsync", methods=["GET"])
+@app.route(
+    "/<string:provider_name>/<string:env>/snapshots/<string:identifier>/commands/rsync",
+    methods=["GET"]
+)
 @auth.login_required
 @log_this
 def command_rsync_from_snap(provider_name, env, identifier=None):
@@ -543,6 +744,12 @@ def resize2fs(provider_name, env, identifier):
     return response_ok(command=command)
 
 
+def _valid_identifiers(identifiers):
+    return isinstance(identifiers, list) and bool(identifiers) and all(
+        identifier and isinstance(identifier, str) for identifier in identifiers
+    )
+
+
 def _validate_payload(keys):
     data = request.get_json()
     data_keys = data.keys()
@@ -587,10 +794,13 @@ def update_team_labels(provider_name, env):
     vm_name = data.get('vm_name', None)
     team_name = data.get('team_name', None)
     zone = data.get('zone', None)
-    if not (vm_name and team_name and zone):
+    if not team_name or bool(vm_name) != bool(zone):
         return response_invalid_request("Invalid data {}".format(data))
     try:
         provider = build_provider(provider_name, env)
+        if not vm_name:
+            disks = provider.update_all_team_labels(team_name)
+            return response_ok(disks={disk: bool(status) for disk, status in disks.items()})
         provider.update_team_labels(vm_name, team_name, zone)
     except Exception as e:
         print_exc()
@@ -598,6 +808,121 @@ def update_team_labels(provider_name, env):
     return response_ok()
 
 
+@app.route("/<string:provider_name>/<string:env>/operation/<string:identifier>", methods=["GET"])
+@auth.login_required
+@log_this
+def get_operation(provider_name, env, identifier):
+    try:
+        operation = Operation.objects(
+            id=identifier, provider=provider_name, environment=env
+        ).first()
+    except ValidationError:
+        operation = None
+    except Exception as e:
+        print_exc()
+        return response_invalid_request(str(e))
+
+    if not operation:
+        return response_not_found(identifier)
+    try:
+        operation = operations.expire_if_stale(operation)
+    except Exception:
+        print_exc()
+    return response_ok(**operation.get_json)
+
+
+def _volume_json(volume):
+    return {'identifier': volume.identifier}
+
+
+def _snapshot_json(snapshot):
+    return {
+        'identifier': snapshot.identifier,
+        'description': snapshot.description,
+        'volume_path': snapshot.volume.path,
+        'size': snapshot.size_bytes,
+    }
+
+
+def _bulk_snapshot_json(results):
+    snapshots = []
+    for identifier, snapshot, error in results:
+        if error:
+            snapshots.append({'volume': identifier, 'error': str(error)})
+        else:
+            snapshots.append(dict(_snapshot_json(snapshot), volume=identifier))
+    return {'snapshots': snapshots}
+
+
+def _new_snapshot_json(snapshot):
+    return {
+        'identifier': snapshot.identifier,
+        'description': snapshot.description,
+        'volume_path': snapshot.volume.path,
+    }
+
+
+@app.route("/metrics", methods=["GET"])
+@auth.login_required
+def get_metrics():
+    return response_ok(**metrics.snapshot())
+
+
+@app.cli.command("refresh-discovery")
+def refresh_discovery():
+    """Download the Compute discovery document used by the gce provider"""
+    path = ProviderGce.refresh_discovery_document()
+    print("Discovery document saved to {}".format(path))
+
+
+@app.cli.command("seed-disk-names")
+def seed_disk_names():
+    """Seed the per group disk name counters from the existing volumes"""
+    print("Seeded disk name counters of {} groups".format(
+        ProviderGce.seed_disk_name_counters()
+    ))
+
+
+@app.cli.command("create-indexes")
+def create_mongo_indexes():
+    """Create the MongoDB indexes, models do not create them on first query"""
+    print("Normalized the path of {} volumes".format(Volume.normalize_paths()))
+    collections, errors = create_indexes()
+    for collection in collections:
+        print("Indexes created on {}".format(collection))
+    try:
+        print("Indexes created on {}".format(CredentialBase.create_indexes()))
+    except Exception as e:
+        errors['credentials'] = e
+    for collection, error in errors.items():
+        print("Could not create indexes on {}: {}".format(collection, error))
+    if errors:
+        raise SystemExit(1)
+
+
+@app.cli.command("bench-volume-reads")
+@click.option("--count", default=1000, help="Volumes read by each strategy")
+def bench_volume_reads(count):
+    """Compare docs/sec reading volumes as documents and as raw projections"""
+    strategies = (
+        ("documents", lambda: [volume.get_json for volume in Volume.objects.limit(count)]),
+        ("only", lambda: [
+            volume.get_json
+            for volume in Volume.objects.only(*VOLUME_JSON_FIELDS).limit(count)
+        ]),
+        ("as_pymongo", lambda: list(
+            Volume.objects.only(*VOLUME_JSON_FIELDS).as_pymongo().limit(count)
+        )),
+    )
+    for name, read in strategies:
+        start = time()
+        docs = len(read())
+        elapsed = time() - start
+        print("{}: {} docs in {:.3f}s, {:.0f} docs/sec".format(
+            name, docs, elapsed, docs / elapsed if elapsed else 0
+        ))
+
+
 @app.route('/')
 def default_route():
     response = "volume-provider, from dbaas/dbdev <br>"
@@ -1,13 +1,21 @@
 import os
 import logging
-from time import sleep
+from time import time
 from faasclient.client import Client
 from volume_provider.clients.errors import APIError
-from volume_provider.settings import TEAM_API_URL
+from volume_provider.settings import (
+    TEAM_API_URL, CLIENT_CACHE_SIZE, CLIENT_CACHE_TTL, FAAS_TOKEN_TTL
+)
+from volume_provider.utils.cache import LocalCache
+from volume_provider.utils.wait import wait_for, WaitTimeout
 from dbaas_base_provider.team import TeamClient
 
 
 LOG = logging.getLogger(__name__)
+CLIENTS = LocalCache('faas_clients', maxsize=CLIENT_CACHE_SIZE, ttl=CLIENT_CACHE_TTL)
+JOB_TIMEOUT = 1500
+JOB_MAX_DELAY = 30
+
 
 class FaaSClient(object):
 
@@ -18,16 +26,36 @@ class FaaSClient(object):
     @property
     def client(self):
         if not self._client:
-            self._client = Client(
-                authurl=self.credential.endpoint,
-                user=self.credential.user, key=self.credential.password,
-                tenant_name=self.credential.project,
-                insecure=not self.credential.is_secure
+            key = (
+                self.credential.provider, self.credential.environment,
+                self.credential.fingerprint
             )
+            self._client = CLIENTS.get_or_create(key, self.build_client)
+        if time() - self._client.authenticated_at >= FAAS_TOKEN_TTL:
+            self.authenticate(self._client)
         return self._client
 
+    def build_client(self):
+        client = Client(
+            authurl=self.credential.endpoint,
+            user=self.credential.user, key=self.credential.password,
+            tenant_name=self.credential.project,
+            insecure=not self.credential.is_secure
+        )
+        return self.authenticate(client)
+
+    def authenticate(self, client):
+        LOG.info("[FaaS] Authenticating {}".format(self.credential.environment))
+        client.url, client.token = client.get_auth()
+        client.authenticated_at = time()
+        return client
+
     def execute(self, call, expected_code, *args, **kw):
         status, content = call(*args, **kw)
+        if status == 401:
+            LOG.info("[FaaS] Token rejected on {}, authenticating again".format(call))
+            self.authenticate(self.client)
+            status, content = call(*args, **kw)
         LOG.info("[FaaS] Response from {} with {}: {} - {}".format(
             call, args, status, content
         ))
@@ -118,14 +146,19 @@ class FaaSClient(object):
             export.identifier, snapshot.identifier
         )
 
-    def wait_for_job_finished(self, job_id, attempts=50, interval=30):
+    def wait_for_job_finished(self, job_id, timeout=JOB_TIMEOUT):
         job_result = None
-        for i in range(attempts):
-            sleep(interval)
+
+        def probe():
             job = self.execute(self.client.jobs_get, 200, job_id)
-            if job['status'] == 'finished':
-                job_result = job['result']
-                break
+            return job if job['status'] == 'finished' else None
+
+        try:
+            job_result = wait_for(
+                probe, 'faas.job', timeout=timeout, max_delay=JOB_MAX_DELAY
+            )['result']
+        except WaitTimeout:
+            LOG.warning("[FaaS] Job {} not finished after {}s".format(job_id, timeout))
 
         if not job_result or 'id' not in job_result:
             raise APIError(500, 'Error while restoring snapshot - {}'.format(
@@ -0,0 +1,142 @@
+import logging
+from threading import Event, Lock, Thread
+from time import sleep, monotonic
+
+from volume_provider.settings import GCE_POLL_INTERVAL, GCE_POLL_BATCH_SIZE
+from volume_provider.utils import metrics
+from volume_provider.utils.wait import WaitTimeout, WaitCancelled
+
+
+LOG = logging.getLogger(__name__)
+
+
+class PendingOperation(object):
+
+    def __init__(self, name):
+        self.name = name
+        self.result = None
+        self.waiters = 0
+        self.done = Event()
+
+
+class ZoneOperationPoller(object):
+    """Refreshes every pending zone operation of the process together.
+
+    Waiting callers register their operation and block, while a single
+    thread lists the pending ones of each (project, zone) with one
+    zoneOperations.list call per tick and wakes the callers of those done.
+    """
+
+    def __init__(self, interval=GCE_POLL_INTERVAL, batch_size=GCE_POLL_BATCH_SIZE):
+        self.interval = interval
+        self.batch_size = batch_size
+        self.list_calls = 0
+        self.errors = 0
+        self._pending = {}
+        self._clients = {}
+        self._lock = Lock()
+        self._thread = None
+        metrics.register('gce_operation_poller', self.stats)
+
+    def wait(self, client, project, zone, name, timeout, cancel=None):
+        pending = self._register(client, project, zone, name)
+        started = monotonic()
+        try:
+            if cancel is None:
+                done = pending.done.wait(timeout)
+            else:
+                done = self._wait_or_cancel(pending, timeout, cancel)
+        finally:
+            self._unregister(project, zone, name)
+
+        if not done:
+            raise WaitTimeout('Timeout after {:.0f}s waiting operation {}'.format(timeout, name))
+        metrics.observe(
+            'wait.gce.{}'.format(pending.result.get('operationType', 'operation')),
+            monotonic() - started
+        )
+        return pending.result
+
+    def _wait_or_cancel(self, pending, timeout, cancel):
+        deadline = monotonic() + timeout
+        while not pending.done.wait(min(self.interval, max(deadline - monotonic(), 0))):
+            if cancel.is_set():
+                raise WaitCancelled('Cancelled waiting operation {}'.format(pending.name))
+            if monotonic() >= deadline:
+                return False
+        return True
+
+    def _register(self, client, project, zone, name):
+        key = (project, zone)
+        with self._lock:
+            self._clients[key] = client
+            operations = self._pending.setdefault(key, {})
+            pending = operations.get(name)
+            if pending is None:
+                pending = operations[name] = PendingOperation(name)
+            pending.waiters += 1
+            if not self._thread or not self._thread.is_alive():
+                self._thread = Thread(target=self._run, daemon=True)
+                self._thread.start()
+        return pending
+
+    def _unregister(self, project, zone, name):
+        key = (project, zone)
+        with self._lock:
+            operations = self._pending.get(key, {})
+            pending = operations.get(name)
+            if pending:
+                pending.waiters -= 1
+                if pending.waiters <= 0:
+                    operations.pop(name)
+            if not operations:
+                self._pending.pop(key, None)
+                self._clients.pop(key, None)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                groups = [
+                    (key, self._clients[key], list(operations.values()))
+                    for key, operations in self._pending.items()
+                ]
+                if not groups:
+                    self._thread = None
+                    return
+            for (project, zone), client, operations in groups:
+                for i in range(0, len(operations), self.batch_size):
+                    self._refresh(client, project, zone, operations[i:i + self.batch_size])
+            sleep(self.interval)
+
+    def _refresh(self, client, project, zone, operations):
+        by_name = {op.name: op for op in operations if not op.done.is_set()}
+        if not by_name:
+            return
+        query = ' OR '.join('(name = "{}")'.format(name) for name in by_name)
+        try:
+            self.list_calls += 1
+            result = client.zoneOperations().list(
+                project=project, zone=zone, filter=query, maxResults=len(by_name)
+            ).execute()
+        except Exception as e:
+            self.errors += 1
+            LOG.warning('Could not list operations on %s/%s: %s', project, zone, e)
+            return
+
+        for item in result.get('items', []):
+            pending = by_name.get(item.get('name'))
+            if pending and item.get('status') == 'DONE':
+                pending.result = item
+                pending.done.set()
+
+    def stats(self):
+        with self._lock:
+            pending = sum(len(operations) for operations in self._pending.values())
+            zones = len(self._pending)
+        return {
+            'pending': pending,
+            'zones': zones,
+            'list_calls': self.list_calls,
+            'errors': self.errors,
+            'interval': self.interval,
+        }
@@ -1,4 +1,4 @@
-from volume_provider.models import Volume
+from volume_provider.models import DeviceReservation
 from volume_provider.credentials.base import CredentialBase, CredentialAdd
 
 
@@ -21,14 +21,30 @@ class CredentialAWS(CredentialBase):
         return self.content['ebs_type']
 
     @staticmethod
-    def next_device(owner_address):
-        base = '/dev/sd{}'
+    def next_device(owner_address, preferred=None):
+        """Reserves a free device on owner_address, preferred when it is free,
+        until release_device
+        """
         linux_devices = ['f', 'g', 'h', 'i', 'j', 'k', 'l', 'm', 'n', 'o', 'p']
-        for volume in Volume.objects.filter(owner_address=owner_address):
-            device = volume.path[-1]
-            if device in linux_devices:
-                linux_devices.remove(device)
-        return base.format(linux_devices[0])
+        devices = ['/dev/sd{}'.format(letter) for letter in linux_devices]
+        if preferred:
+            devices.insert(0, preferred)
+        device = DeviceReservation.reserve(owner_address, devices)
+        if device is None:
+            raise EnvironmentError("No free device on {}".format(owner_address))
+        return device
+
+    @staticmethod
+    def release_device(owner_address, device):
+        DeviceReservation.release(owner_address, device)
+
+    def move_device(self, owner_address, to_address, device):
+        """Moves the reservation of device to to_address, keeping the same
+        device when it is free there. Returns the new device.
+        """
+        new_device = self.next_device(to_address, preferred=device)
+        self.release_device(owner_address, device)
+        return new_device
 
     @property
     def iops(self):
@@ -1,8 +1,20 @@
-from volume_provider.settings import MONGODB_PARAMS, MONGODB_DB
+import hashlib
+import json
+from time import time
+
+from volume_provider.settings import MONGODB_PARAMS, MONGODB_DB, CREDENTIAL_CACHE_TTL
 from dbaas_base_provider.baseCredential import BaseCredential
 from dbaas_base_provider.base import ReturnDocument
 
 
+# (provider, environment) -> (content, version, checked_at)
+_contents = {}
+
+
+def invalidate_content(provider, environment):
+    _contents.pop((provider, environment), None)
+
+
 class CredentialMongoDB(BaseCredential):
     provider_type = "volume_provider"
 
@@ -17,14 +29,37 @@ class CredentialMongoDB(BaseCredential):
 
 class CredentialBase(CredentialMongoDB):
 
+    @classmethod
+    def create_indexes(cls):
+        collection = cls(None, None).credential
+        collection.create_index([("provider", 1), ("environment", 1)])
+        return collection.name
+
     def get_content(self):
+        key = (self.provider, self.environment)
+        cached = _contents.get(key)
+        if cached:
+            content, version, checked_at = cached
+            if time() - checked_at < CREDENTIAL_CACHE_TTL:
+                return content
+
+            stored = self.credential.find_one({
+                "provider": self.provider,
+                "environment": self.environment,
+            }, {"version": True})
+            if stored and stored.get("version") == version:
+                _contents[key] = (content, version, time())
+                return content
+
         content = self.credential.find_one({
             "provider": self.provider,
             "environment": self.environment,
         })
         if content:
+            _contents[key] = (content, content.get("version"), time())
             return content
 
+        invalidate_content(self.provider, self.environment)
         raise NotImplementedError("No {} credential for {}".format(
             self.provider, self.environment
         ))
@@ -36,6 +71,11 @@ class CredentialBase(CredentialMongoDB):
 
         return super(CredentialBase, self).content
 
+    @property
+    def fingerprint(self):
+        content = json.dumps(self.content, sort_keys=True, default=str)
+        return hashlib.sha1(content.encode('utf-8')).hexdigest()
+
     def get_by(self, **kwargs):
         return self.credential.find({'provider': self.provider, **kwargs})
 
@@ -43,6 +83,7 @@ class CredentialBase(CredentialMongoDB):
         return self.get_by()
 
     def delete(self):
+        invalidate_content(self.provider, self.environment)
         return self.credential.remove({
             'provider': self.provider,
             'environment': self.environment
@@ -56,21 +97,27 @@ class CredentialAdd(CredentialMongoDB):
         self._content = content
 
     def save(self):
+        invalidate_content(self.provider, self.environment)
         return self.credential.find_one_and_update(
             {
                 'provider': self.provider,
                 'environment': self.environment
             },
-            {'$set': {
-                'provider': self.provider,
-                'environment': self.environment,
-                **self.content
-            }},
+            {
+                '$set': {
+                    'provider': self.provider,
+                    'environment': self.environment,
+                    **self.content
+                },
+                '$inc': {'version': 1},
+                '$currentDate': {'updated_at': True},
+            },
             upsert=True,
             return_document=ReturnDocument.AFTER
         )
 
     def delete(self):
+        invalidate_content(self.provider, self.environment)
         return self.credential.delete_one({
             'provider': self.provider, 'environment': self.environment
         })
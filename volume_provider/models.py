@@ -1,9 +1,18 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime
+
+from bson import ObjectId
 from mongoengine import (
     Document, StringField, IntField, ReferenceField, CASCADE, DictField,
-    DateTimeField
+    DateTimeField, Q, NotUniqueError, ListField
 )
 
 
+CURSOR_DATE_FORMAT = '%Y-%m-%dT%H:%M:%S.%f'
+RESERVATION_KEY = [('owner_address', 1), ('device', 1)]
+VOLUME_JSON_FIELDS = ('size_kb', 'group', 'resource_id', 'identifier', 'path', 'owner_address')
+
+
 class Volume(Document):
     size_kb = IntField(required=True)
     group = StringField(max_length=50, required=True)
@@ -15,6 +24,68 @@ class Volume(Document):
     vm_name = StringField(max_length=200, required=False)
     labels = DictField(required=False)
     disk_offering_type = StringField(max_length=255, required=False, default=None)
+    path_lower = StringField(max_length=1000, required=False)
+    device = StringField(max_length=255, required=False)
+
+    meta = {
+        'indexes': [
+            'identifier', 'group', 'owner_address', 'vm_name', 'path_lower', 'device',
+            'labels.team_slug_name',
+        ],
+        'auto_create_index': False,
+    }
+
+    def clean(self):
+        self.path_lower, self.device = self.normalize_path(self.path)
+
+    @staticmethod
+    def normalize_path(path):
+        """Lowercased path and its last component, the device name"""
+        if not path:
+            return None, None
+        path = path.lower()
+        return path, path.rstrip('/').rsplit('/', 1)[-1] or None
+
+    @classmethod
+    def normalize_paths(cls):
+        count = 0
+        for volume in cls.objects(path_lower=None).only('path'):
+            path_lower, device = cls.normalize_path(volume.path)
+            cls.objects(pk=volume.pk).update(set__path_lower=path_lower, set__device=device)
+            count += 1
+        return count
+
+    @classmethod
+    def newest_id(cls):
+        data = cls.objects.order_by('-id').only('id').as_pymongo().first()
+        return data['_id'] if data else None
+
+    @classmethod
+    def created_after(cls, pk):
+        queryset = cls.objects(id__gt=pk) if pk else cls.objects
+        return queryset.only('id').as_pymongo().first() is not None
+
+    @classmethod
+    def find_raw(cls, fields=VOLUME_JSON_FIELDS, **filters):
+        """Matching volume as a dict with only fields, no Volume is built.
+        Like get, raises MultipleObjectsReturned when several volumes match.
+        """
+        found = list(cls.objects(**filters).only(*fields).as_pymongo().limit(2))
+        if not found:
+            return None
+        if len(found) > 1:
+            raise cls.MultipleObjectsReturned(
+                '{} volumes match {}'.format(len(found), filters)
+            )
+        data = found[0]
+        return {field: data.get(field) for field in fields}
+
+    @classmethod
+    def raw_values(cls, field, **filters):
+        return [
+            data.get(field)
+            for data in cls.objects(**filters).only(field).as_pymongo()
+        ]
 
     def set_group(self, group):
         self.group = group
@@ -28,14 +99,7 @@ class Volume(Document):
 
     @property
     def get_json(self):
-        return {
-            'size_kb': self.size_kb,
-            'group': self.group,
-            'resource_id': self.resource_id,
-            'identifier': self.identifier,
-            'path': self.path,
-            'owner_address': self.owner_address,
-        }
+        return {field: getattr(self, field) for field in VOLUME_JSON_FIELDS}
 
     @property
     def pairs(self):
@@ -61,11 +125,79 @@ class Snapshot(Document):
     labels = DictField(required=False)
     size_bytes = IntField(required=False)
     created_at = DateTimeField(required=False)
+    status = StringField(required=False, max_length=50)
+    download_bytes = IntField(required=False)
+    storage_bytes = IntField(required=False)
+    status_checked_at = DateTimeField(required=False)
+
+    meta = {
+        'indexes': [
+            'identifier',
+            ('volume', 'created_at', 'id'),
+        ],
+        'auto_create_index': False,
+    }
 
     @property
     def uuid(self):
         return str(self.pk)
 
+    @classmethod
+    def drop_unique_identifier_index(cls):
+        """Identifiers of faas and k8s snapshots only are unique inside one
+        deployment, drops the unique index older deploys created
+        """
+        collection = cls._get_collection()
+        for name, index in collection.index_information().items():
+            if index.get('unique') and index['key'] == [('identifier', 1)]:
+                collection.drop_index(name)
+                return True
+        return False
+
+    @classmethod
+    def page(cls, volume, limit, cursor=None, fields=None):
+        """Snapshots of volume, newest first, with keyset pagination on
+        (created_at, id). Returns the page and the cursor of the next one.
+        """
+        snapshots = cls.objects(volume=volume).order_by('-created_at', '-id')
+        if cursor:
+            snapshots = snapshots.filter(cls._after(*cls.decode_cursor(cursor)))
+        if fields:
+            snapshots = snapshots.only(*fields)
+
+        page = list(snapshots.limit(limit + 1))
+        next_cursor = None
+        if len(page) > limit:
+            page = page[:limit]
+            next_cursor = cls.encode_cursor(page[-1])
+        return page, next_cursor
+
+    @staticmethod
+    def _after(created_at, pk):
+        # Snapshots without created_at come last on a descending sort
+        if created_at is None:
+            return Q(created_at=None, id__lt=pk)
+        return (
+            Q(created_at__lt=created_at) |
+            Q(created_at=created_at, id__lt=pk) |
+            Q(created_at=None)
+        )
+
+    @staticmethod
+    def encode_cursor(snapshot):
+        created_at = snapshot.created_at.strftime(CURSOR_DATE_FORMAT) if snapshot.created_at else ''
+        value = '{}|{}'.format(created_at, snapshot.pk)
+        return urlsafe_b64encode(value.encode('utf-8')).decode('ascii')
+
+    @staticmethod
+    def decode_cursor(cursor):
+        try:
+            created_at, pk = urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8').split('|')
+            created_at = datetime.strptime(created_at, CURSOR_DATE_FORMAT) if created_at else None
+            return created_at, ObjectId(pk)
+        except Exception:
+            raise ValueError('Invalid cursor {}'.format(cursor))
+
     def to_json(self):
         return {
             'id': self._id,
@@ -74,3 +206,153 @@ class Snapshot(Document):
             'volume': self.volume,
             'size_bytes': self.size_bytes,
         }
+
+
+class Operation(Document):
+    PENDING = 'pending'
+    RUNNING = 'running'
+    SUCCESS = 'success'
+    ERROR = 'error'
+
+    provider = StringField(required=True, max_length=50)
+    environment = StringField(required=True, max_length=255)
+    action = StringField(required=True, max_length=100)
+    status = StringField(required=True, max_length=20, default=PENDING)
+    created_at = DateTimeField(required=True)
+    started_at = DateTimeField(required=False)
+    finished_at = DateTimeField(required=False)
+    result = DictField(required=False)
+    error = StringField(required=False)
+    owner = StringField(required=False, max_length=255)
+    heartbeat_at = DateTimeField(required=False)
+
+    meta = {
+        'indexes': [('provider', 'environment', 'status'), ('owner', 'status')],
+        'auto_create_index': False,
+    }
+
+    @property
+    def uuid(self):
+        return str(self.pk)
+
+    @property
+    def finished(self):
+        return self.status in (self.SUCCESS, self.ERROR)
+
+    @property
+    def get_json(self):
+        return {
+            'id': self.uuid,
+            'action': self.action,
+            'status': self.status,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'result': self.result,
+            'error': self.error,
+        }
+
+
+class DiskNameCounter(Document):
+    """Last dataN disk number handed out to a volume group, and the numbers
+    released by creates that failed
+    """
+    group = StringField(primary_key=True, max_length=50)
+    value = IntField(required=True, default=0)
+    free = ListField(IntField())
+
+    @classmethod
+    def next_value(cls, group, seed):
+        """Reuses a released number, so a retried create finds the disk of the
+        failed one, or atomically increments the counter of group. A missing
+        counter starts at seed().
+        """
+        released = cls.objects(group=group, free__0__exists=True).modify(pop__free=-1)
+        if released is not None:
+            return released.free[0]
+        counter = cls.objects(group=group).modify(new=True, inc__value=1)
+        if counter is None:
+            cls.seed(group, seed())
+            counter = cls.objects(group=group).modify(new=True, inc__value=1)
+        return counter.value
+
+    @classmethod
+    def seed(cls, group, value):
+        """Counters never move back, seeding again is harmless"""
+        cls.objects(group=group).update_one(upsert=True, max__value=value)
+
+    @classmethod
+    def release(cls, group, value):
+        cls.objects(group=group).update_one(add_to_set__free=value)
+
+
+class DeviceReservation(Document):
+    """Device path in use on a host, unique per owner address"""
+    owner_address = StringField(required=True, max_length=20)
+    device = StringField(required=True, max_length=1000)
+
+    meta = {
+        'indexes': [{'fields': ('owner_address', 'device'), 'unique': True}],
+        'auto_create_index': False,
+    }
+    _index_checked = False
+
+    @classmethod
+    def ensure_unique_index(cls):
+        """Reservations are only atomic with the unique index, so it is
+        created here, once per process, instead of trusting create-indexes
+        """
+        if DeviceReservation._index_checked:
+            return
+        cls.ensure_indexes()
+        indexes = cls._get_collection().index_information().values()
+        if not any(index.get('unique') and index['key'] == RESERVATION_KEY for index in indexes):
+            raise EnvironmentError('Unique index of {} is missing'.format(
+                cls._get_collection_name()
+            ))
+        DeviceReservation._index_checked = True
+
+    @classmethod
+    def reserve(cls, owner_address, devices):
+        """Reserves the first of devices that is free on owner_address, the
+        unique index makes concurrent reservations pick different ones.
+        Volumes created before reservations existed also count as in use.
+        """
+        cls.ensure_unique_index()
+        in_use = set(Volume.raw_values('path', owner_address=owner_address))
+        in_use.update(
+            data['device']
+            for data in cls.objects(owner_address=owner_address).only('device').as_pymongo()
+        )
+        for device in devices:
+            if device in in_use:
+                continue
+            try:
+                cls(owner_address=owner_address, device=device).save(force_insert=True)
+            except NotUniqueError:
+                continue
+            return device
+        return None
+
+    @classmethod
+    def release(cls, owner_address, device):
+        return cls.objects(owner_address=owner_address, device=device).delete()
+
+
+def create_indexes():
+    """Indexes are not created on first query, this runs on deploy.
+    Each model is independent, returns the collections done and the errors
+    of the others by collection.
+    """
+    collections, errors = [], {}
+    for model in (DeviceReservation, Operation, Volume, Snapshot):
+        collection = model._get_collection_name()
+        try:
+            if model is Snapshot:
+                Snapshot.drop_unique_identifier_index()
+            model.ensure_indexes()
+        except Exception as e:
+            errors[collection] = e
+            continue
+        collections.append(collection)
+    return collections, errors
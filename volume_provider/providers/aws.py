@@ -1,23 +1,35 @@
 from os import getenv
 from collections import namedtuple
-from time import sleep
+from libcloud.common.exceptions import BaseHTTPError
 from libcloud.compute.types import Provider
 from libcloud.compute.providers import get_driver
-from volume_provider.settings import HTTP_PROXY, HTTPS_PROXY, TAG_BACKUP_DBAAS
+from volume_provider.settings import HTTP_PROXY, HTTPS_PROXY, TAG_BACKUP_DBAAS, CLIENT_CACHE_SIZE, \
+    CLIENT_CACHE_TTL, AWS_DRIVER_POOL_SIZE
 from volume_provider.credentials.aws import CredentialAWS, CredentialAddAWS
 from volume_provider.providers.base import ProviderBase, CommandsBase
 from volume_provider.settings import TEAM_API_URL
 from dbaas_base_provider.team import TeamClient
+from volume_provider.utils.cache import Pool
+from volume_provider.utils.wait import wait_for, WaitTimeout
 
 
 STATE_AVAILABLE = 'available'
 STATE_INUSE = 'inuse'
-ATTEMPTS = 60
-DELAY = 5
+STATE_TIMEOUT = 300
 SimpleEbs = namedtuple('ebs', 'id')
+DRIVERS = Pool(
+    'ebs_drivers', maxsize=CLIENT_CACHE_SIZE,
+    max_idle=AWS_DRIVER_POOL_SIZE, ttl=CLIENT_CACHE_TTL
+)
 
 
 class ProviderAWS(ProviderBase):
+    # libcloud drivers can not be shared between threads
+    bulk_workers = 1
+
+    def __init__(self, environment, auth_info=None):
+        super(ProviderAWS, self).__init__(environment, auth_info=auth_info)
+        self._ebs_by_id = {}
 
     def get_commands(self):
         return CommandsAWS(self)
@@ -27,6 +39,20 @@ class ProviderAWS(ProviderBase):
         return 'ebs'
 
     def build_client(self):
+        self._client_key = (
+            self.provider, self.environment,
+            self.credential.access_id, self.credential.region, HTTP_PROXY,
+            self.credential.fingerprint
+        )
+        return DRIVERS.acquire(self._client_key, self._build_client)
+
+    def release(self):
+        if self._client:
+            DRIVERS.release(self._client_key, self._client)
+            self._client = None
+        self._ebs_by_id.clear()
+
+    def _build_client(self):
         cls = get_driver(Provider.EC2)
         client = cls(
             self.credential.access_id,
@@ -61,26 +87,33 @@ class ProviderAWS(ProviderBase):
             if location.name == zone:
                 return location
 
-    def __get_ebs(self, volume):
-        for ebs in self.client.list_volumes():
-            if ebs.id == volume.identifier:
-                return ebs
-        return None
+    def __get_ebs(self, volume, refresh=False):
+        """EBS looked up by id, kept until the end of the request unless refresh"""
+        ebs = self._ebs_by_id.get(volume.identifier)
+        if ebs is None or refresh:
+            found = self.client.list_volumes(ex_filters={'volume-id': volume.identifier})
+            if not found:
+                return None
+            ebs = self._ebs_by_id[volume.identifier] = found[0]
+        return ebs
 
     def _get_snapshot_status(self, snapshot):
         ebs_snapshot = self.__get_snapshot(snapshot)
         return ebs_snapshot.state
 
     def waiting_be(self, state, volume):
-        ebs = self.__get_ebs(volume)
-        for _ in range(ATTEMPTS):
-            if ebs.state == state:
-                return True
-            sleep(DELAY)
-            ebs = self.__get_ebs(volume)
-        raise EnvironmentError("Volume {} is {} should be {}".format(
-            volume.id, ebs.state, state
-        ))
+        current = {}
+
+        def probe():
+            current['state'] = self.__get_ebs(volume, refresh=True).state
+            return current['state'] == state
+
+        try:
+            return wait_for(probe, 'ebs.{}'.format(state), timeout=STATE_TIMEOUT)
+        except WaitTimeout:
+            raise EnvironmentError("Volume {} is {} should be {}".format(
+                volume.id, current.get('state'), state
+            ))
 
     def __waiting_be_available(self, volume):
         return self.waiting_be(STATE_AVAILABLE, volume)
@@ -134,16 +167,25 @@ class ProviderAWS(ProviderBase):
         volume.path = self.credential.next_device(volume.owner_address)
 
     def _add_access(self, volume, to_address, *args, **kwargs):
+        if volume.path and volume.owner_address != to_address:
+            volume.path = self.credential.move_device(
+                volume.owner_address, to_address, volume.path
+            )
         volume.owner_address = to_address
         volume.save()
         return
 
+    def _create_volume_failed(self, volume):
+        if volume.path:
+            self.credential.release_device(volume.owner_address, volume.path)
+
     def _delete_volume(self, volume):
         for snapshot in volume.snapshots:
             self._remove_snapshot(snapshot, True)
         ebs = self.__get_ebs(volume)
         self.__detach_volume(volume)
         self.client.destroy_volume(ebs)
+        self.credential.release_device(volume.owner_address, volume.path)
 
     def _remove_access(self, volume, to_address):
         return
@@ -175,8 +217,13 @@ class ProviderAWS(ProviderBase):
         snapshot.description = new_snapshot.name
 
     def __get_snapshot(self, snapshot):
-        ebs = self.__get_ebs(snapshot.volume)
-        for ebs_snapshot in ebs.list_snapshots():
+        try:
+            ebs_snapshots = self.client.list_snapshots(snapshot=SimpleEbs(snapshot.identifier))
+        except BaseHTTPError as e:
+            if 'InvalidSnapshot.NotFound' not in str(e):
+                raise
+            ebs_snapshots = []
+        for ebs_snapshot in ebs_snapshots:
             if ebs_snapshot.id == snapshot.identifier:
                 return ebs_snapshot
         raise EnvironmentError("Snapshot {} not found to volume {}".format(
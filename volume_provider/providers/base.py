@@ -1,15 +1,46 @@
 import logging
 import requests
+from concurrent.futures import ThreadPoolExecutor
 from requests.auth import HTTPBasicAuth
 from datetime import datetime
 
-from volume_provider.settings import LOGGING_LEVEL, TEAM_API_URL, DBAAS_TEAM_API_URL, USER_DBAAS_API, PASSWORD_DBAAS_API
-from volume_provider.models import Volume, Snapshot
+from volume_provider.settings import (
+    LOGGING_LEVEL, TEAM_API_URL, DBAAS_TEAM_API_URL, USER_DBAAS_API, PASSWORD_DBAAS_API,
+    TEAM_LABELS_CACHE_SIZE, TEAM_LABELS_CACHE_TTL, TEAM_LABELS_CACHE_STALE_TTL,
+    BULK_SNAPSHOT_WORKERS, LABEL_UPDATE_WORKERS, VOLUME_MISS_CACHE_SIZE, VOLUME_MISS_CACHE_TTL
+)
+from mongoengine import signals
+from volume_provider.models import Volume, Snapshot, VOLUME_JSON_FIELDS
+from volume_provider.utils import cache, sessions
 from dbaas_base_provider.baseProvider import BaseProvider
 from dbaas_base_provider.team import TeamClient
 
 logging.basicConfig(level=LOGGING_LEVEL)
 
+# Labels filled on every call, everything else comes from the team
+TEAM_CALL_LABELS = ('created_at', 'engine', 'infra_name', 'database_name', 'origin')
+TEAM_LABELS = cache.StaleCache(
+    'team_labels', maxsize=TEAM_LABELS_CACHE_SIZE,
+    fresh_ttl=TEAM_LABELS_CACHE_TTL, ttl=TEAM_LABELS_CACHE_STALE_TTL
+)
+
+SNAPSHOT_LIST_FIELDS = (
+    'identifier', 'description', 'created_at', 'size_bytes', 'status', 'download_bytes'
+)
+
+# identifier or path -> (newest volume id,) when it was not found
+MISSING_VOLUMES = cache.LocalCache(
+    'missing_volumes', maxsize=VOLUME_MISS_CACHE_SIZE, ttl=VOLUME_MISS_CACHE_TTL
+)
+
+
+def forget_missing_volumes(sender, document, **kwargs):
+    MISSING_VOLUMES.clear()
+
+
+signals.post_save.connect(forget_missing_volumes, sender=Volume)
+
+
 class BasicProvider(BaseProvider):
     provider_type = "volume_provider"
 
@@ -18,13 +49,19 @@ class BasicProvider(BaseProvider):
         volume = Volume.objects(**{search_field: identifier}).get()
         return volume
 
+    @staticmethod
+    def load_identifiers(**filters):
+        return Volume.raw_values('identifier', **filters)
+
 
 class ProviderBase(BasicProvider):
+    bulk_workers = BULK_SNAPSHOT_WORKERS
+    label_workers = LABEL_UPDATE_WORKERS
 
     def __init__(self, environment, auth_info=None):
         super(ProviderBase, self).__init__(
             environment,
-            auth_info=None
+            auth_info=auth_info
         )
 
     @property
@@ -36,6 +73,20 @@ class ProviderBase(BasicProvider):
     def get_commands(self):
         raise NotImplementedError
 
+    def credential_add(self, content):
+        success, message = super(ProviderBase, self).credential_add(content)
+        if success:
+            cache.invalidate(self.provider, self.environment)
+        return success, message
+
+    def credential_delete(self):
+        deleted = self.credential.delete()
+        cache.invalidate(self.provider, self.environment)
+        return deleted
+
+    def release(self):
+        pass
+
     def create_volume(self, group, size_kb, to_address, snapshot_id=None, zone=None, vm_name=None,
                       team_name=None, engine=None, db_name=None, disk_offering_type=None):
         snapshot = None
@@ -47,18 +98,26 @@ class ProviderBase(BasicProvider):
         volume.zone = zone
         volume.vm_name = vm_name
         volume.owner_address = to_address
-        self._create_volume(
-            volume, snapshot=snapshot,
-            team_name=team_name,
-            engine=engine,
-            db_name=db_name,
-            disk_offering_type=disk_offering_type
-        )
-        self._add_access(volume, volume.owner_address)
-        volume.save()
+        try:
+            self._create_volume(
+                volume, snapshot=snapshot,
+                team_name=team_name,
+                engine=engine,
+                db_name=db_name,
+                disk_offering_type=disk_offering_type
+            )
+            self._add_access(volume, volume.owner_address)
+            volume.save()
+        except Exception:
+            self._create_volume_failed(volume)
+            raise
 
         return volume
 
+    def _create_volume_failed(self, volume):
+        """Undo what _create_volume reserved for a volume that was not saved"""
+        pass
+
     def _create_volume(self, volume, snapshot=None, *args, **kwargs):
         raise NotImplementedError
 
@@ -99,44 +158,89 @@ class ProviderBase(BasicProvider):
         pass
 
     def get_volume(self, identifier_or_path):
+        return self._find_volume(identifier_or_path, self._load_volume_or_none)
+
+    def get_volume_data(self, identifier_or_path, fields=VOLUME_JSON_FIELDS):
+        """Same lookup as get_volume, reading only fields straight from MongoDB"""
+        return self._find_volume(
+            identifier_or_path, lambda filters: Volume.find_raw(fields, **filters)
+        )
+
+    @staticmethod
+    def _load_volume_or_none(filters):
         try:
-            return self.load_volume(identifier_or_path)
-        except Volume.DoesNotExist:
-            pass
-        try:
-            return self.load_volume(
-                identifier_or_path,
-                search_field="path__icontains"
-            )
+            return Volume.objects(**filters).get()
         except Volume.DoesNotExist:
             return None
 
+    @staticmethod
+    def _find_volume(identifier_or_path, load):
+        """A cached miss holds while no volume was created after it, in any
+        process, so new volumes are found right away by every worker.
+        """
+        missing = MISSING_VOLUMES.get((identifier_or_path,))
+        if missing and not Volume.created_after(missing[0]):
+            return None
+        path_lower = identifier_or_path.lower()
+        lookups = (
+            {"identifier": identifier_or_path},
+            {"path_lower": path_lower},
+            {"device": path_lower},
+            # Volumes not normalized yet by create-indexes
+            {"path_lower": None, "path__icontains": identifier_or_path},
+        )
+        for filters in lookups:
+            try:
+                volume = load(filters)
+            except Volume.MultipleObjectsReturned:
+                # A device such as xvdf is used by volumes of many hosts
+                logging.warning('Several volumes match {}, ignoring them'.format(filters))
+                continue
+            if volume is not None:
+                return volume
+        MISSING_VOLUMES.set((identifier_or_path,), (Volume.newest_id(),))
+        return None
+
     def get_team_labels_formatted(self, team_name, infra_name='', database_name='', engine_name=''):
-        team_labels = {}
-        url = DBAAS_TEAM_API_URL + team_name
-        response = requests.get(url, verify=False, auth=HTTPBasicAuth(USER_DBAAS_API, PASSWORD_DBAAS_API))
-        if response.status_code == 200:
-            team = response.json()
-            team_labels = {
-                "servico_de_negocio": team["business_service"],
-                "cliente": team["client"],
-                "team_slug_name": team["slug"],
-                "team_id": team["identifier"],
-                "created_at": datetime.now().strftime('%Y-%m-%d_%H-%M-%S'),
-                "engine": engine_name,
-                "infra_name": infra_name,
-                "database_name": database_name,
-                'origin': 'dbaas'
-            }
-        else:
-            team = TeamClient(api_url=TEAM_API_URL, team_name=team_name)
-            team_labels = team.make_labels(
-                engine_name=engine_name,
-                infra_name=infra_name,
-                database_name=database_name
-            )
+        team_labels = dict(TEAM_LABELS.get_or_load(
+            (team_name,), lambda: self._get_team_labels(team_name)
+        ))
+        team_labels.update({
+            "created_at": datetime.now().strftime('%Y-%m-%d_%H-%M-%S'),
+            "engine": engine_name,
+            "infra_name": infra_name,
+            "database_name": database_name,
+            'origin': 'dbaas'
+        })
         return team_labels
 
+    @staticmethod
+    def _get_team_labels(team_name):
+        if DBAAS_TEAM_API_URL:
+            url = DBAAS_TEAM_API_URL + team_name
+            try:
+                response = sessions.get_session('team_api').get(
+                    url, verify=False, auth=HTTPBasicAuth(USER_DBAAS_API, PASSWORD_DBAAS_API),
+                    timeout=sessions.TIMEOUT
+                )
+            except requests.RequestException as e:
+                logging.error('Error when try to get team {}. Error: {}'.format(team_name, e))
+                response = None
+            if response is not None and response.status_code == 200:
+                team = response.json()
+                return {
+                    "servico_de_negocio": team["business_service"],
+                    "cliente": team["client"],
+                    "team_slug_name": team["slug"],
+                    "team_id": team["identifier"],
+                }
+
+        team = TeamClient(api_url=TEAM_API_URL, team_name=team_name)
+        return {
+            key: value for key, value in team.make_labels().items()
+            if key not in TEAM_CALL_LABELS
+        }
+
     def add_access(self, identifier, to_address, access_type=None):
         volume = self.load_volume(identifier)
         self._add_access(volume, to_address, access_type)
@@ -171,6 +275,28 @@ class ProviderBase(BasicProvider):
     def _get_snapshot_status(self, identifier):
         raise NotImplementedError
 
+    def get_snapshots_status(self, identifiers):
+        """Returns (identifier, state, snapshot) for each identifier, loading
+        every Snapshot with a single query.
+        """
+        snapshots = {
+            snap.identifier: snap
+            for snap in Snapshot.objects(identifier__in=identifiers).select_related()
+        }
+        states = self._get_snapshots_status(list(snapshots.values())) if snapshots else {}
+        results = []
+        for identifier in identifiers:
+            snap = snapshots.get(identifier)
+            if snap is None:
+                state = {'code': 404, 'message': 'Snapshot object not found'}
+            else:
+                state = states[identifier]
+            results.append((identifier, state, snap))
+        return results
+
+    def _get_snapshots_status(self, snapshots):
+        return {snap.identifier: self._get_snapshot_status(snap) for snap in snapshots}
+
     def take_snapshot(self, identifier, team, engine, db_name, persist=False):
         volume = self.load_volume(identifier)
         snapshot = Snapshot(volume=volume, created_at=datetime.now())
@@ -185,6 +311,27 @@ class ProviderBase(BasicProvider):
         snapshot.save()
         return snapshot
 
+    def take_snapshots(self, identifiers, team, engine, db_name, persist=False):
+        """Takes the snapshot of every volume with up to bulk_workers at once,
+        returning (identifier, snapshot, error) for each one.
+        """
+        def take(identifier):
+            try:
+                snapshot = self.take_snapshot(identifier, team, engine, db_name, persist)
+            except Exception as e:
+                logging.error('Error taking snapshot of {}. Error: {}'.format(identifier, e))
+                return identifier, None, e
+            return identifier, snapshot, None
+
+        if not identifiers:
+            return []
+        if not self._client:
+            # Workers share the client, building it lazily each one could build its own
+            self._client = self.build_client()
+        workers = min(self.bulk_workers, len(identifiers))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(take, identifiers))
+
     def _take_snapshot(self, volume, snapshot, team, engine, db_name, persist):
         raise NotImplementedError
 
@@ -201,6 +348,17 @@ class ProviderBase(BasicProvider):
     def _remove_snapshot(self, snapshot, force):
         raise NotImplementedError
 
+    def remove_all_snapshots(self, group):
+        summary = self._remove_all_snapshots(group)
+        Snapshot.objects(
+            volume__in=Volume.objects(group=group),
+            description__in=summary['removed']
+        ).delete()
+        return summary
+
+    def _remove_all_snapshots(self, group):
+        raise NotImplementedError
+
     def restore_snapshot(self,
             identifier, zone=None, vm_name=None,
             engine=None, team_name=None, db_name=None, disk_offering_type=None
@@ -213,26 +371,37 @@ class ProviderBase(BasicProvider):
         volume.vm_name = vm_name or snapshot.volume.vm_name
         volume.zone = zone or snapshot.volume.zone
         volume.disk_offering_type = disk_offering_type
-        self._restore_snapshot(snapshot, volume, engine, team_name, db_name, disk_offering_type)
-        volume.save()
+        try:
+            self._restore_snapshot(
+                snapshot, volume, engine, team_name, db_name, disk_offering_type
+            )
+            volume.save()
+        except Exception:
+            self._create_volume_failed(volume)
+            raise
         return volume
 
     def _restore_snapshot(self, snapshot, volume, engine, team_name, db_name, disk_offering_type):
         raise NotImplementedError
 
     def get_volumes_from(self, **kwargs):
-        return Volume.objects.filter(**kwargs).values_list('resource_id')
+        return Volume.raw_values('resource_id', **kwargs)
 
     def get_snapshots_from(self, offset=0, **kwargs):
+        """Matching snapshots but the last offset ones, read through a cursor"""
         snaps = Snapshot.objects.filter(**kwargs)
-        if not snaps:
-            return []
-        snaps = list(snaps)
         if offset:
-            return snaps[:-offset]
+            count = snaps.count()
+            if count <= offset:
+                return []
+            snaps = snaps.limit(count - offset)
 
         return snaps
 
+    def list_snapshots(self, identifier, limit, cursor=None):
+        volume = self.load_volume(identifier)
+        return Snapshot.page(volume, limit, cursor, fields=SNAPSHOT_LIST_FIELDS)
+
     def new_disk_with_migration(self):
         return self._new_disk_with_migration()
 
@@ -245,6 +414,12 @@ class ProviderBase(BasicProvider):
     def _update_team_labels(self, volume, team_name, zone):
         pass
 
+    def update_all_team_labels(self, team_name):
+        return self._update_all_team_labels(team_name)
+
+    def _update_all_team_labels(self, team_name):
+        raise NotImplementedError
+
 
 class CommandsBase(BasicProvider):
 
@@ -1,37 +1,56 @@
 import json
 import logging
 from datetime import datetime
-from time import sleep
 import httplib2
 import google_auth_httplib2
 import pytz
 import socket
+import threading
 
 import socket
 from os import getenv
-from collections import namedtuple
-from time import sleep
+from collections import namedtuple, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
 from dateutil import relativedelta
 from googleapiclient.errors import HttpError
 
 import googleapiclient.discovery
+import googleapiclient.http
 from google.oauth2 import service_account
 
-from volume_provider.settings import HTTP_PROXY, TAG_BACKUP_DBAAS
+from volume_provider.settings import (
+    HTTP_PROXY, TAG_BACKUP_DBAAS, CLIENT_CACHE_SIZE, CLIENT_CACHE_TTL,
+    GCE_BATCH_SIZE, SNAPSHOT_STATUS_MIN_INTERVAL
+)
 from volume_provider.credentials.gce import CredentialGce, CredentialAddGce
 from volume_provider.providers.base import ProviderBase, CommandsBase
 from volume_provider.settings import TEAM_API_URL
 from dbaas_base_provider.team import TeamClient
-from volume_provider.models import Volume
+from volume_provider.models import Volume, Snapshot, DiskNameCounter
+from volume_provider.clients.gce import ZoneOperationPoller
+from volume_provider.utils import discovery, metrics
+from volume_provider.utils.wait import wait_for, WaitTimeout
+from volume_provider.utils.cache import LocalCache
 import time
 
 LOG = logging.getLogger(__name__)
+CLIENTS = LocalCache('gce_clients', maxsize=CLIENT_CACHE_SIZE, ttl=CLIENT_CACHE_TTL)
+OPERATION_TIMEOUT = 900
+INSTANCE_STATUS_TIMEOUT = 600
+SNAPSHOT_READY_TIMEOUT = 15
+POLLER = ZoneOperationPoller()
+LABELS_ATTEMPTS = 3
+TEAM_LABEL_KEYS = ('servico_de_negocio', 'cliente', 'team_slug_name', 'team_id')
+SNAPSHOT_FINAL_STATUS = ('READY', 'FAILED')
+
+
+def _to_int(value):
+    return int(value) if value is not None else None
 
 
 class ProviderGce(ProviderBase):
 
-    seconds_to_wait = 3
     persisted_day = str(getenv("SNAPSHOTS_PERSIST_DAY", "10")).zfill(2)
 
     def get_commands(self):
@@ -42,42 +61,58 @@ class ProviderGce(ProviderBase):
         return 'gce'
 
     def build_client(self):
-        service_account_data = self.credential.content['service_account']
+        key = (self.provider, self.environment, self.credential.fingerprint)
+        return CLIENTS.get_or_create(key, self._build_client)
+
+    def _build_client(self):
+        service_account_data = dict(self.credential.content['service_account'])
         service_account_data['private_key'] = service_account_data['private_key'].replace('\\n', '\n')
 
         credentials = service_account.Credentials.from_service_account_info(
             service_account_data, scopes=self.credential.scopes
         )
 
-        cont = 0
-        while cont <= 1:
-            cont += 1
-            try:
-                if HTTP_PROXY:
-                    _, host, port = HTTP_PROXY.split(':')
-                    try:
-                        port = int(port)
-                    except ValueError:
-                        raise EnvironmentError('HTTP_PROXY incorrect format')
-
-                    socket.setdefaulttimeout(15)
+        # httplib2 is not thread safe and the client is shared between
+        # requests, so every greenlet gets its own authorized connection
+        local = threading.local()
+        build_http = self._build_http
 
-                    proxied_http = httplib2.Http(
-                        proxy_info=httplib2.ProxyInfo(httplib2.socks.PROXY_TYPE_HTTP, host.replace('//', ''), port)
-                    )
+        def authorized_http():
+            if not hasattr(local, 'http'):
+                local.http = google_auth_httplib2.AuthorizedHttp(
+                    credentials, http=build_http()
+                )
+            return local.http
 
-                    authorized_http = google_auth_httplib2.AuthorizedHttp(credentials, http=proxied_http)
-                    service = googleapiclient.discovery.build('compute', 'v1', http=authorized_http, num_retries=2)
+        def build_request(http, *args, **kwargs):
+            return googleapiclient.http.HttpRequest(authorized_http(), *args, **kwargs)
 
-                else:
-                    service = googleapiclient.discovery.build('compute', 'v1', credentials=credentials, num_retries=2)
+        document = discovery.get_document('compute', 'v1', self._build_http)
+        return googleapiclient.discovery.build_from_document(
+            document, http=authorized_http(), requestBuilder=build_request
+        )
 
-                return service
+    @staticmethod
+    def _build_http():
+        if not HTTP_PROXY:
+            return googleapiclient.http.build_http()
 
-            except:
-                raise
+        _, host, port = HTTP_PROXY.split(':')
+        try:
+            port = int(port)
+        except ValueError:
+            raise EnvironmentError('HTTP_PROXY incorrect format')
+
+        socket.setdefaulttimeout(15)
+        return httplib2.Http(
+            proxy_info=httplib2.ProxyInfo(
+                httplib2.socks.PROXY_TYPE_HTTP, host.replace('//', ''), port
+            )
+        )
 
-        return False
+    @classmethod
+    def refresh_discovery_document(cls):
+        return discovery.refresh_document('compute', 'v1', cls._build_http)
 
     def build_credential(self):
         return CredentialGce(self.provider, self.environment)
@@ -96,21 +131,42 @@ class ProviderGce(ProviderBase):
         vol = self.get_volumes_from(group=group)
         return [self.get_device_name(x) for x in vol]
 
-    def _get_new_disk_name(self, volume):
+    @staticmethod
+    def _disk_number(disk_name):
+        if 'data' not in disk_name:
+            return 0
+        try:
+            return int(disk_name.rsplit("data", 1)[1])
+        except ValueError:
+            return 0
+
+    def _last_disk_number(self, volume):
         all_disks = self._get_volumes(volume.zone, volume.vm_name, volume.group)
-        all_disks_name_data = []
-        for disk in all_disks:
-            if 'data' in disk:
-                all_disks_name_data.append(disk)
+        return max([self._disk_number(disk) for disk in all_disks] or [0])
 
-        disk_name = "data%s" % (int(all_disks_name_data[-1].split("data")[1]) + 1)\
-                    if len(all_disks_name_data)\
-                    else "data1"
+    def _get_new_disk_name(self, volume):
+        number = DiskNameCounter.next_value(
+            volume.group, lambda: self._last_disk_number(volume)
+        )
+        return "%s-data%s" % (volume.group, number)
 
-        return "%s-%s" % (volume.group, disk_name)
+    @classmethod
+    def seed_disk_name_counters(cls):
+        """Seeds DiskNameCounter from the disks of every group, returns the seeded groups"""
+        last_numbers = {}
+        for data in Volume.objects.only('group', 'resource_id').as_pymongo():
+            number = cls._disk_number(data.get('resource_id') or '')
+            if number > last_numbers.get(data['group'], 0):
+                last_numbers[data['group']] = number
+        for group, number in last_numbers.items():
+            DiskNameCounter.seed(group, number)
+        return len(last_numbers)
 
     def _create_volume(self, volume, snapshot=None, *args, **kwargs):
+        # set_group copies the disk of a pair, it must not be released on failure
+        volume.resource_id = None
         disk_name = self._get_new_disk_name(volume)
+        volume.resource_id = disk_name
         team_name = kwargs.get('team_name')
         disk_offering_type = kwargs.get("disk_offering_type", None)
         if not team_name:
@@ -180,6 +236,11 @@ class ProviderGce(ProviderBase):
 
         return ready
 
+    def _create_volume_failed(self, volume):
+        number = self._disk_number(volume.resource_id or '')
+        if number:
+            DiskNameCounter.release(volume.group, number)
+
     def _add_access(self, volume, to_address, *args, **kwargs):
         pass
 
@@ -323,21 +384,29 @@ class ProviderGce(ProviderBase):
             config = {
                 'labels': labels,
                 'name': snapshot_name,
+                'sourceDisk': 'projects/{}/zones/{}/disks/{}'.format(
+                    self.credential.project, volume.zone, volume.resource_id
+                ),
                 "storageLocations": [self.credential.region]
             }
             LOG.info('Starting create snapshot')
             try:
-                _ = self.client.disks().createSnapshot(
-                    project=self.credential.project, zone=volume.zone, disk=volume.resource_id, body=config
+                operation = self.client.snapshots().insert(
+                    project=self.credential.project, body=config
                 ).execute()
 
-                # Redundancia de tempo entre criação e retorno de id
-                sleep(5)
-
-                snap = self.client.snapshots().get(
-                    project=self.credential.project,
-                    snapshot=snapshot_name
-                ).execute()
+                # O id do snapshot vem no targetId da operacao de insert
+                snap = {'id': operation.get('targetId')}
+                if not snap['id']:
+                    snap = wait_for(
+                        lambda: self.get_or_none_resource(
+                            self.client.snapshots,
+                            project=self.credential.project,
+                            snapshot=snapshot_name
+                        ),
+                        'gce.snapshot_registered',
+                        timeout=SNAPSHOT_READY_TIMEOUT
+                    )
             except:
                 LOG.error('Erro ao conectar ao client.snapshot')
                 raise Exception('Erro ao conectar ao client do new take snapshot')
@@ -479,30 +548,187 @@ class ProviderGce(ProviderBase):
         )
 
     def __wait_instance_status(self, volume, status):
-        while self.get_instance_status(volume) != status:
-            sleep(self.seconds_to_wait)
+        return wait_for(
+            lambda: self.get_instance_status(volume) == status,
+            'gce.instance_{}'.format(status.lower()),
+            timeout=INSTANCE_STATUS_TIMEOUT
+        )
 
-        return True
+    def _wait(self, operation, region=None, zone=None):
+        """Waits with the server side operations.wait, falling back to
+        client side polling when it fails.
+        """
+        if not operation:
+            raise EnvironmentError('operation must be provided')
+
+        started = time.monotonic()
+        deadline = started + OPERATION_TIMEOUT
+        try:
+            result = self._server_wait(operation, region, zone, deadline)
+        except WaitTimeout:
+            raise
+        except Exception as e:
+            LOG.warning('Server side wait of %s failed, polling it: %s', operation, e)
+            metrics.incr('gce.wait_fallback')
+            return self._poll_operation(
+                operation, region, zone, max(deadline - time.monotonic(), 0)
+            )
+
+        elapsed = time.monotonic() - started
+        operation_type = result.get('operationType', 'operation')
+        metrics.observe('wait.gce.{}'.format(operation_type), elapsed)
+        return result
+
+    def _server_wait(self, operation, region, zone, deadline):
+        if zone:
+            request = self._get_wait_zone_operation(zone=zone, operation=operation)
+        elif region:
+            request = self._get_wait_region_operation(region=region, operation=operation)
+        else:
+            request = self._get_wait_global_operation(operation=operation)
+
+        while True:
+            try:
+                result = request.execute()
+            except socket.timeout:
+                # The socket timeout can be shorter than the ~2 minutes the
+                # server holds each wait, it is not an API failure
+                LOG.info('Timeout on server side wait of %s, waiting again', operation)
+                metrics.incr('gce.wait_reissued')
+                result = {}
+            if result.get('status') == 'DONE':
+                return result
+            if time.monotonic() >= deadline:
+                raise WaitTimeout('Timeout after {}s waiting operation {}'.format(
+                    OPERATION_TIMEOUT, operation
+                ))
+
+    def _poll_operation(self, operation, region, zone, timeout):
+        """Client side polling. Zone operations of every thread of the process
+        are refreshed together by POLLER, with one zoneOperations.list per tick.
+        """
+        if zone:
+            return POLLER.wait(
+                self.client, self.credential.project, zone, operation, timeout=timeout
+            )
+        if region:
+            request = self.client.regionOperations().get(
+                project=self.credential.project, region=region, operation=operation
+            )
+        else:
+            request = self.client.globalOperations().get(
+                project=self.credential.project, operation=operation
+            )
+
+        def probe():
+            try:
+                result = request.execute()
+            except socket.timeout:
+                LOG.warning('Timeout polling operation %s', operation)
+                return None
+            return result if result.get('status') == 'DONE' else None
+
+        return wait_for(
+            probe,
+            lambda result: 'gce.{}'.format((result or {}).get('operationType', 'operation')),
+            timeout=timeout
+        )
 
     def _delete_volume(self, volume):
         return self.__destroy_volume(volume)
 
-    def _remove_all_snapshots(self, group):
-        snaps = self.client.snapshots().list(
+    def _list_group_snapshots(self, group):
+        request = self.client.snapshots().list(
             project=self.credential.project,
-            filter="labels.group=%s" % group
-        ).execute().get('items', [])
+            filter="labels.group=%s" % group,
+            fields="items/name,nextPageToken"
+        )
+        names = []
+        while request is not None:
+            response = request.execute()
+            names.extend(snap['name'] for snap in response.get('items', []))
+            request = self.client.snapshots().list_next(request, response)
+        return names
+
+    def _execute_batch(self, requests):
+        """Runs {key: request} in GCE_BATCH_SIZE batches and returns
+        {key: (response, exception)}.
+        """
+        results = {}
+
+        def callback(request_id, response, exception):
+            results[request_id] = (response, exception)
+
+        keys = list(requests)
+        for i in range(0, len(keys), GCE_BATCH_SIZE):
+            batch = self.client.new_batch_http_request(callback=callback)
+            for key in keys[i:i + GCE_BATCH_SIZE]:
+                batch.add(requests[key], request_id=key)
+            batch.execute()
+        return results
+
+    def _wait_global_operations(self, operations):
+        """(response, exception) of each operation, the ones still running at
+        the timeout get the WaitTimeout as exception
+        """
+        pending = dict(operations)
+        done = {}
+
+        def probe():
+            results = self._execute_batch({
+                name: self.client.globalOperations().get(
+                    project=self.credential.project, operation=operation
+                )
+                for name, operation in pending.items()
+            })
+            for name, (response, exception) in results.items():
+                if exception or response.get('status') == 'DONE':
+                    done[name] = (response, exception)
+                    pending.pop(name)
+            return not pending
 
-        for ss in snaps:
-            self.client.snapshots().delete(
-                project=self.credential.project,
-                snapshot=ss.get('name')
-            ).execute()
+        try:
+            wait_for(probe, 'gce.bulk_snapshot_delete', timeout=OPERATION_TIMEOUT)
+        except WaitTimeout as error:
+            LOG.warning('%s operations still running: %s', len(pending), error)
+            for name in pending:
+                done[name] = (None, error)
+        return done
+
+    def _remove_all_snapshots(self, group):
+        names = self._list_group_snapshots(group)
+        results = self._execute_batch({
+            name: self.client.snapshots().delete(
+                project=self.credential.project, snapshot=name
+            )
+            for name in names
+        })
+
+        removed, failed, operations = [], {}, {}
+        for name, (response, exception) in results.items():
+            if isinstance(exception, HttpError) and exception.resp.status == 404:
+                removed.append(name)
+            elif exception:
+                failed[name] = str(exception)
+            else:
+                operations[name] = response['name']
+
+        for name, (response, exception) in self._wait_global_operations(operations).items():
+            error = exception or (response or {}).get('error')
+            if error:
+                failed[name] = str(error)
+            else:
+                removed.append(name)
+
+        return {'found': len(names), 'removed': removed, 'failed': failed}
 
     def _new_disk_with_migration(self):
         return True
 
     def _get_snapshot_status(self, snapshot):
+        state = self._stored_snapshot_state(snapshot)
+        if state:
+            return state
         try:
             t1 = time.time()
             LOG.info('Starting take snapshot status')
@@ -516,85 +742,217 @@ class ProviderGce(ProviderBase):
                 LOG.error('Erro ao conectar ao client.snapshot')
                 return {'code': 408, 'message': 'Erro ao conectar ao client'}
 
-            if status_snaps:
-                result = {
-                    'id': status_snaps['id'],
-                    'status': status_snaps['status'],
-                    'db': status_snaps['labels']['database_name'],
-                }
-
-                # Set return code by mapping result status
-                status_map = {
-                    'ready': 200,
-                    'creating': 201,
-                    'uploading': 202,
-                    'deleting': 200,
-                    'failed': 400,
-                }
-                result['code'] = status_map[result['status'].lower()]
-
-                if result['code'] == 200:
-                    result.update({
-                        'size': status_snaps.get('downloadBytes'),
-                    })
-
-                t2 = time.time()
-                LOG.info('Tempo total em execução de status snapshot: {}s'.format(t2 - t1))
-                return result
-
-            else:
-                return {'code': 404, 'message': 'Snapshot not found'}
+            result = self._snapshot_state(status_snaps)
+            self._save_snapshot_state(snapshot, status_snaps)
+            t2 = time.time()
+            LOG.info('Tempo total em execução de status snapshot: {}s'.format(t2 - t1))
+            return result
 
         except Exception as e:
             return {'code': 500, 'message': e}
 
+    @staticmethod
+    def _snapshot_state(status_snaps):
+        if not status_snaps:
+            return {'code': 404, 'message': 'Snapshot not found'}
+
+        result = {
+            'id': status_snaps['id'],
+            'status': status_snaps['status'],
+            'db': status_snaps['labels']['database_name'],
+        }
+
+        # Set return code by mapping result status
+        status_map = {
+            'ready': 200,
+            'creating': 201,
+            'uploading': 202,
+            'deleting': 200,
+            'failed': 400,
+        }
+        result['code'] = status_map[result['status'].lower()]
+
+        if result['code'] == 200:
+            result.update({
+                'size': status_snaps.get('downloadBytes'),
+            })
+        return result
+
+    def _stored_snapshot_state(self, snapshot):
+        """State saved on the Snapshot, when it is final or was checked less
+        than SNAPSHOT_STATUS_MIN_INTERVAL seconds ago.
+        """
+        if not (snapshot.status and snapshot.status_checked_at):
+            return None
+        age = (datetime.now() - snapshot.status_checked_at).total_seconds()
+        if snapshot.status not in SNAPSHOT_FINAL_STATUS and age >= SNAPSHOT_STATUS_MIN_INTERVAL:
+            return None
+        return self._snapshot_state({
+            'id': snapshot.identifier,
+            'status': snapshot.status,
+            'labels': {'database_name': (snapshot.labels or {}).get('database_name')},
+            'downloadBytes': (
+                str(snapshot.download_bytes) if snapshot.download_bytes is not None else None
+            ),
+        })
+
+    @staticmethod
+    def _save_snapshot_state(snapshot, status_snaps):
+        if not status_snaps or not snapshot.pk:
+            return
+        snapshot.status = status_snaps['status']
+        snapshot.download_bytes = _to_int(status_snaps.get('downloadBytes'))
+        snapshot.storage_bytes = _to_int(status_snaps.get('storageBytes'))
+        snapshot.status_checked_at = datetime.now()
+        Snapshot.objects(pk=snapshot.pk).update(
+            set__status=snapshot.status,
+            set__download_bytes=snapshot.download_bytes,
+            set__storage_bytes=snapshot.storage_bytes,
+            set__status_checked_at=snapshot.status_checked_at
+        )
+
+    def _get_snapshots_status(self, snapshots):
+        """Status of many snapshots with one filtered snapshots.list for each
+        GCE_BATCH_SIZE of them. Snapshots with a stored state are not listed.
+        """
+        states = {}
+        pending = []
+        for snapshot in snapshots:
+            state = self._stored_snapshot_state(snapshot)
+            if state:
+                states[snapshot.identifier] = state
+            else:
+                pending.append(snapshot)
+
+        identifiers = [snapshot.identifier for snapshot in pending]
+        found = {}
+        for i in range(0, len(identifiers), GCE_BATCH_SIZE):
+            chunk = identifiers[i:i + GCE_BATCH_SIZE]
+            request = self.client.snapshots().list(
+                project=self.credential.project,
+                filter=' OR '.join('(id = "{}")'.format(identifier) for identifier in chunk),
+                fields='items(id,status,labels,downloadBytes,storageBytes),nextPageToken'
+            )
+            try:
+                while request is not None:
+                    response = request.execute()
+                    for item in response.get('items', []):
+                        found[item['id']] = item
+                    request = self.client.snapshots().list_next(request, response)
+            except Exception as e:
+                LOG.error('Erro ao listar snapshots: {}'.format(e))
+                for identifier in chunk:
+                    found[identifier] = {'code': 408, 'message': 'Erro ao conectar ao client'}
+
+        for snapshot in pending:
+            item = found.get(snapshot.identifier)
+            if item and 'code' in item:
+                states[snapshot.identifier] = item
+                continue
+            try:
+                states[snapshot.identifier] = self._snapshot_state(item)
+                self._save_snapshot_state(snapshot, item)
+            except Exception as e:
+                states[snapshot.identifier] = {'code': 500, 'message': e}
+        return states
+
     def build_type_disk_url(self, disk_type):
         url = "/projects/{project}/regions/{region}/diskTypes/{disk_type}"
         return url.format(project=self.credential.project,
                           region=self.credential.region,
                           disk_type=disk_type if disk_type is not None else 'pd-standard')
 
-    def update_labels(self, resource_id, zone, team):
+    def update_labels(self, resource_id, zone, team, disk_gcp=None):
         try:
-            # function to get labelFingerprint and Labels info from a disk of GCP
-            disk_gcp = self.client.disks().get(project=self.credential.project,
-                                               zone=zone,
-                                               disk=resource_id).execute()
-            labelFingerprint = disk_gcp['labelFingerprint']
-            labels = disk_gcp['labels']
-
-            # add info of new team
-            labels['servico_de_negocio'] = team.get('servico_de_negocio')
-            labels['cliente'] = team.get('cliente')
-            labels['team_slug_name'] = team.get('team_slug_name')
-            labels['team_id'] = team.get('team_id')
-
-            # create the body of function with Label Fingerprint and Labels
-            body = dict()
-            body['labels'] = labels
-            body['labelFingerprint'] = labelFingerprint
-
-            update_disk_labels = self.client.disks().setLabels(project=self.credential.project,
-                                                               zone=zone,
-                                                               resource=resource_id,
-                                                               body=body).execute()
-            return self.wait_operation(operation=update_disk_labels.get('name'),
-                                       zone=zone)
+            for _ in range(LABELS_ATTEMPTS):
+                # function to get labelFingerprint and Labels info from a disk of GCP
+                if disk_gcp is None:
+                    disk_gcp = self.client.disks().get(project=self.credential.project,
+                                                       zone=zone,
+                                                       disk=resource_id).execute()
+                labelFingerprint = disk_gcp['labelFingerprint']
+                labels = disk_gcp.get('labels', {})
+
+                # add info of new team
+                for key in TEAM_LABEL_KEYS:
+                    labels[key] = team.get(key)
+
+                # create the body of function with Label Fingerprint and Labels
+                body = dict()
+                body['labels'] = labels
+                body['labelFingerprint'] = labelFingerprint
+
+                try:
+                    update_disk_labels = self.client.disks().setLabels(
+                        project=self.credential.project, zone=zone,
+                        resource=resource_id, body=body
+                    ).execute()
+                except HttpError as error:
+                    # labels changed since the disk was read
+                    if error.resp.status != 412:
+                        raise
+                    disk_gcp = None
+                    continue
+                updated = self.wait_operation(operation=update_disk_labels.get('name'),
+                                              zone=zone)
+                self._save_team_labels(resource_id, zone, team)
+                return updated
+            raise EnvironmentError('Labels of {} changed while updating them'.format(resource_id))
         except Exception as error:
-            print(error)
+            LOG.warning('Could not update the labels of %s: %s', resource_id, error)
             return False
 
+    @staticmethod
+    def _save_team_labels(resource_id, zone, team):
+        """Keeps Volume.labels, used to find the disks of a team, as set on GCE"""
+        Volume.objects(resource_id=resource_id, zone=zone).update(**{
+            'set__labels__{}'.format(key): team.get(key) for key in TEAM_LABEL_KEYS
+        })
+
+    def _update_disks_labels(self, disks, team):
+        """Updates the team labels of [(resource_id, zone)], reading the disks in
+        batches and setting their labels with up to label_workers at once.
+        """
+        requests = {
+            str(i): self.client.disks().get(
+                project=self.credential.project, zone=zone, disk=resource_id
+            )
+            for i, (resource_id, zone) in enumerate(disks)
+        }
+        read = self._execute_batch(requests)
+
+        def update(i):
+            resource_id, zone = disks[i]
+            disk_gcp, _ = read.get(str(i), (None, None))
+            return resource_id, self.update_labels(resource_id, zone, team, disk_gcp)
+
+        if not disks:
+            return {}
+        workers = min(self.label_workers, len(disks))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return dict(executor.map(update, range(len(disks))))
+
     def _update_team_labels(self, vm_name, team_name, zone):
-        disks = dict()
         team = self.get_team_labels_formatted(team_name)
-        status = self.update_labels(vm_name, zone, team)
-        disks[vm_name] = status
-        other_volumes = Volume.objects.filter(vm_name=vm_name)
+        disks = [(vm_name, zone)]
+        other_volumes = Volume.objects.filter(vm_name=vm_name).only('resource_id', 'zone')
         for v in other_volumes:
-            status = self.update_labels(v.resource_id, v.zone, team)
-            disks[v.resource_id] = status
+            disks.append((v.resource_id, v.zone))
 
-        return disks
+        return self._update_disks_labels(disks, team)
+
+    def _update_all_team_labels(self, team_name):
+        team = self.get_team_labels_formatted(team_name)
+        volumes = Volume.objects.filter(
+            labels__team_slug_name=team.get('team_slug_name')
+        ).only('resource_id', 'zone', 'vm_name')
+        disks = []
+        for v in volumes:
+            if v.vm_name:
+                disks.append((v.vm_name, v.zone))
+            disks.append((v.resource_id, v.zone))
+
+        return self._update_disks_labels(list(OrderedDict.fromkeys(disks)), team)
 
 
 class CommandsGce(CommandsBase):
@@ -1,12 +1,28 @@
+from hashlib import sha256
+
 import jinja2
 import yaml
 from kubernetes.client import Configuration, ApiClient, CoreV1Api
 
+from volume_provider.settings import (
+    CLIENT_CACHE_SIZE, CLIENT_CACHE_TTL, K8S_CONNECTION_POOL_SIZE
+)
+from volume_provider.utils.cache import LocalCache
 from volume_provider.utils.uuid_helper import generate_random_uuid
 from volume_provider.credentials.k8s import CredentialK8s, CredentialAddK8s
 from volume_provider.providers.base import ProviderBase, CommandsBase
 
 
+def close_client(client):
+    client.api_client.close()
+
+
+CLIENTS = LocalCache(
+    'k8s_clients', maxsize=CLIENT_CACHE_SIZE, ttl=CLIENT_CACHE_TTL,
+    on_evict=close_client
+)
+
+
 class ProviderK8s(ProviderBase):
 
     def get_commands(self):
@@ -30,10 +46,19 @@ class ProviderK8s(ProviderBase):
         return yaml.safe_load(yaml_file)
 
     def build_client(self):
+        token = self.auth_info['K8S-Token']
+        key = (
+            self.provider, self.environment, self.auth_info['K8S-Endpoint'],
+            sha256(token.encode('utf-8')).hexdigest(), self._verify_ssl
+        )
+        return CLIENTS.get_or_create(key, self._build_client)
+
+    def _build_client(self):
         configuration = Configuration()
         configuration.api_key['authorization'] = "Bearer {}".format(self.auth_info['K8S-Token'])
         configuration.host = self.auth_info['K8S-Endpoint']
         configuration.verify_ssl = self._verify_ssl
+        configuration.connection_pool_maxsize = K8S_CONNECTION_POOL_SIZE
         api_client = ApiClient(configuration)
         return CoreV1Api(api_client)
 
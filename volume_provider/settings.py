@@ -1,5 +1,5 @@
 from collections import OrderedDict
-from os import getenv
+from os import getenv, path
 import logging
 
 
@@ -29,7 +29,40 @@ TEAM_API_URL = getenv("TEAM_API_URL", None)
 DBAAS_TEAM_API_URL = getenv("DBAAS_TEAM_API_URL", None)
 USER_DBAAS_API = getenv("USER_DBAAS_API", "user")
 PASSWORD_DBAAS_API = getenv("PASSWORD_DBAAS_API", "password")
+HTTP_CONNECT_TIMEOUT = float(getenv("HTTP_CONNECT_TIMEOUT", 3))
+HTTP_READ_TIMEOUT = float(getenv("HTTP_READ_TIMEOUT", 10))
+HTTP_RETRIES = int(getenv("HTTP_RETRIES", 2))
+HTTP_POOL_SIZE = int(getenv("HTTP_POOL_SIZE", 10))
+TEAM_LABELS_CACHE_SIZE = int(getenv("TEAM_LABELS_CACHE_SIZE", 512))
+TEAM_LABELS_CACHE_TTL = int(getenv("TEAM_LABELS_CACHE_TTL", 3600))
+TEAM_LABELS_CACHE_STALE_TTL = int(getenv("TEAM_LABELS_CACHE_STALE_TTL", 7 * 24 * 3600))
 
 TAG_BACKUP_DBAAS = getenv("TAG_BACKUP_DBAAS", None)
 LOGGING_LEVEL = int(getenv('LOGGING_LEVEL', logging.INFO))
 SENTRY_DSN = getenv("SENTRY_DSN", None)
+
+CREDENTIAL_CACHE_TTL = int(getenv("CREDENTIAL_CACHE_TTL", 30))
+CLIENT_CACHE_SIZE = int(getenv("CLIENT_CACHE_SIZE", 32))
+CLIENT_CACHE_TTL = int(getenv("CLIENT_CACHE_TTL", 3600))
+FAAS_TOKEN_TTL = int(getenv("FAAS_TOKEN_TTL", 3000))
+K8S_CONNECTION_POOL_SIZE = int(getenv("K8S_CONNECTION_POOL_SIZE", 10))
+WAIT_INITIAL_DELAY = float(getenv("WAIT_INITIAL_DELAY", 1.0))
+WAIT_MAX_DELAY = float(getenv("WAIT_MAX_DELAY", 15.0))
+GCE_POLL_INTERVAL = float(getenv("GCE_POLL_INTERVAL", 2.0))
+GCE_POLL_BATCH_SIZE = int(getenv("GCE_POLL_BATCH_SIZE", 50))
+SNAPSHOT_STATUS_MIN_INTERVAL = int(getenv("SNAPSHOT_STATUS_MIN_INTERVAL", 10))
+GCE_BATCH_SIZE = int(getenv("GCE_BATCH_SIZE", 100))
+BULK_SNAPSHOT_WORKERS = int(getenv("BULK_SNAPSHOT_WORKERS", 8))
+LABEL_UPDATE_WORKERS = int(getenv("LABEL_UPDATE_WORKERS", 8))
+VOLUME_MISS_CACHE_SIZE = int(getenv("VOLUME_MISS_CACHE_SIZE", 1024))
+VOLUME_MISS_CACHE_TTL = int(getenv("VOLUME_MISS_CACHE_TTL", 30))
+SNAPSHOT_PAGE_SIZE = int(getenv("SNAPSHOT_PAGE_SIZE", 100))
+SNAPSHOT_PAGE_MAX_SIZE = int(getenv("SNAPSHOT_PAGE_MAX_SIZE", 1000))
+OPERATION_WORKERS = int(getenv("OPERATION_WORKERS", 10))
+OPERATION_HEARTBEAT_INTERVAL = int(getenv("OPERATION_HEARTBEAT_INTERVAL", 30))
+OPERATION_STALE_TIMEOUT = int(getenv("OPERATION_STALE_TIMEOUT", 180))
+AWS_DRIVER_POOL_SIZE = int(getenv("AWS_DRIVER_POOL_SIZE", 10))
+
+GCE_DISCOVERY_PATH = getenv(
+    "GCE_DISCOVERY_PATH", path.join(path.dirname(__file__), "discovery")
+)
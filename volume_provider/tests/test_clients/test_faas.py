@@ -0,0 +1,59 @@
+from unittest import TestCase
+from unittest.mock import patch, MagicMock
+
+from volume_provider.clients.faas import FaaSClient, CLIENTS
+from volume_provider.settings import FAAS_TOKEN_TTL
+
+
+def fake_credential(environment='dev'):
+    credential = MagicMock(provider='faas', environment=environment, fingerprint='abc')
+    return credential
+
+
+@patch('volume_provider.clients.faas.Client')
+class FaaSClientTestCase(TestCase):
+
+    def setUp(self):
+        CLIENTS.clear()
+
+    def tearDown(self):
+        CLIENTS.clear()
+
+    def test_authenticated_client_shared(self, client_cls):
+        client_cls.return_value.get_auth.return_value = ('http://faas', 'token')
+        client = FaaSClient(fake_credential()).client
+
+        self.assertIs(FaaSClient(fake_credential()).client, client)
+        self.assertEqual(client.token, 'token')
+        self.assertEqual(client.get_auth.call_count, 1)
+
+    @patch('volume_provider.clients.faas.time')
+    def test_token_refreshed_before_expire(self, time_mock, client_cls):
+        client_cls.return_value.get_auth.return_value = ('http://faas', 'token')
+        time_mock.return_value = 100
+        FaaSClient(fake_credential()).client
+
+        time_mock.return_value = 100 + FAAS_TOKEN_TTL
+        client_cls.return_value.get_auth.return_value = ('http://faas', 'new-token')
+        client = FaaSClient(fake_credential()).client
+
+        self.assertEqual(client.token, 'new-token')
+        self.assertEqual(client.get_auth.call_count, 2)
+
+    def test_retry_once_on_unauthorized(self, client_cls):
+        client_cls.return_value.get_auth.return_value = ('http://faas', 'token')
+        faas = FaaSClient(fake_credential())
+        call = MagicMock(side_effect=[(401, ''), (200, {'id': 1})])
+
+        self.assertEqual(faas.execute(call, 200), {'id': 1})
+        self.assertEqual(call.call_count, 2)
+        self.assertEqual(faas.client.get_auth.call_count, 2)
+
+    def test_unauthorized_twice(self, client_cls):
+        client_cls.return_value.get_auth.return_value = ('http://faas', 'token')
+        faas = FaaSClient(fake_credential())
+        call = MagicMock(return_value=(401, 'Unauthorized'))
+
+        with self.assertRaises(Exception):
+            faas.execute(call, 200)
+        self.assertEqual(call.call_count, 2)
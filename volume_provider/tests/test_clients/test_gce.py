@@ -0,0 +1,61 @@
+from unittest import TestCase
+from unittest.mock import MagicMock
+
+from volume_provider.clients.gce import ZoneOperationPoller, PendingOperation
+from volume_provider.utils.wait import WaitTimeout
+
+
+def fake_client(*responses):
+    client = MagicMock()
+    client.zoneOperations.return_value.list.return_value.execute.side_effect = responses
+    return client
+
+
+def operation(name, status='DONE'):
+    return {'name': name, 'status': status, 'operationType': 'insert'}
+
+
+class ZoneOperationPollerTestCase(TestCase):
+
+    def setUp(self):
+        self.poller = ZoneOperationPoller(interval=0.01)
+
+    def test_wait_done(self):
+        client = fake_client(
+            {'items': [operation('op-1', 'RUNNING')]},
+            {'items': [operation('op-1')]},
+        )
+        result = self.poller.wait(client, 'fake-project', 'zone-a', 'op-1', timeout=5)
+
+        self.assertEqual(result, operation('op-1'))
+        self.assertEqual(self.poller.stats()['pending'], 0)
+
+    def test_one_list_call_for_pending_operations(self):
+        client = fake_client({'items': [operation('op-1'), operation('op-2', 'RUNNING')]})
+        pending = [PendingOperation('op-1'), PendingOperation('op-2')]
+        self.poller._refresh(client, 'fake-project', 'zone-a', pending)
+
+        list_call = client.zoneOperations.return_value.list
+        list_call.assert_called_once_with(
+            project='fake-project', zone='zone-a', maxResults=2,
+            filter='(name = "op-1") OR (name = "op-2")'
+        )
+        self.assertTrue(pending[0].done.is_set())
+        self.assertEqual(pending[0].result, operation('op-1'))
+        self.assertFalse(pending[1].done.is_set())
+
+    def test_timeout(self):
+        client = MagicMock()
+        client.zoneOperations.return_value.list.return_value.execute.return_value = {
+            'items': [operation('op-1', 'RUNNING')]
+        }
+
+        with self.assertRaises(WaitTimeout):
+            self.poller.wait(client, 'fake-project', 'zone-a', 'op-1', timeout=0.05)
+        self.assertEqual(self.poller.stats()['pending'], 0)
+
+    def test_list_error_keeps_waiting(self):
+        client = fake_client(Exception('quota'), {'items': [operation('op-1')]})
+
+        self.poller.wait(client, 'fake-project', 'zone-a', 'op-1', timeout=5)
+        self.assertEqual(self.poller.stats()['errors'], 1)
@@ -1,8 +1,9 @@
 from collections import OrderedDict
 from unittest import TestCase
-from unittest.mock import patch
+from unittest.mock import patch, MagicMock
 from volume_provider.settings import MONGODB_HOST, MONGODB_PORT, \
     MONGODB_USER, MONGODB_PWD, MONGODB_ENDPOINT
+from volume_provider.credentials import base
 from volume_provider.credentials.base import CredentialAdd, CredentialBase
 from volume_provider.tests.test_credentials import CredentialAddFake, CredentialBaseFake, \
     FakeMongoDB
@@ -18,6 +19,7 @@ class TestBaseProvider(TestCase):
 
     def tearDown(self):
         FakeMongoDB.clear()
+        base._contents.clear()
 
     def test_base_content(self):
         credential_add = CredentialAddFake(
@@ -59,3 +61,58 @@ class TestBaseProvider(TestCase):
         credential.delete_one.assert_called_once_with({
             "environment": env, "provider": provider
         })
+
+
+class TestCredentialCache(TestCase):
+
+    def setUp(self):
+        CredentialAddFake(PROVIDER, ENVIRONMENT, {"fake": "info"}).save()
+
+    def tearDown(self):
+        FakeMongoDB.clear()
+        base._contents.clear()
+
+    def test_content_cached_between_instances(self):
+        first = CredentialBaseFake(PROVIDER, ENVIRONMENT).content
+        with patch.object(FakeMongoDB, 'find_one') as find_one:
+            second = CredentialBaseFake(PROVIDER, ENVIRONMENT).content
+
+        self.assertFalse(find_one.called)
+        self.assertIs(first, second)
+
+    @patch('volume_provider.credentials.base.time')
+    def test_revalidate_same_version(self, time_mock):
+        time_mock.return_value = 100
+        content = CredentialBaseFake(PROVIDER, ENVIRONMENT).content
+        time_mock.return_value = 1000
+
+        find_one = MagicMock(return_value={'_id': 1})
+        with patch.object(FakeMongoDB, 'find_one', find_one):
+            cached = CredentialBaseFake(PROVIDER, ENVIRONMENT).content
+
+        self.assertIs(cached, content)
+        find_one.assert_called_once_with(
+            {'provider': PROVIDER, 'environment': ENVIRONMENT},
+            {'version': True}
+        )
+
+    @patch('volume_provider.credentials.base.time')
+    def test_revalidate_new_version(self, time_mock):
+        time_mock.return_value = 100
+        CredentialBaseFake(PROVIDER, ENVIRONMENT).content
+        time_mock.return_value = 1000
+
+        new_content = {'fake': 'new', 'version': 2}
+        find_one = MagicMock(side_effect=[{'version': 2}, new_content])
+        with patch.object(FakeMongoDB, 'find_one', find_one):
+            content = CredentialBaseFake(PROVIDER, ENVIRONMENT).content
+
+        self.assertEqual(content, new_content)
+        self.assertEqual(find_one.call_count, 2)
+
+    def test_save_invalidates(self):
+        CredentialBaseFake(PROVIDER, ENVIRONMENT).content
+        self.assertIn((PROVIDER, ENVIRONMENT), base._contents)
+
+        CredentialAddFake(PROVIDER, ENVIRONMENT, {"fake": "new"}).save()
+        self.assertNotIn((PROVIDER, ENVIRONMENT), base._contents)
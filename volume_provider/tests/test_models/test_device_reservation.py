@@ -0,0 +1,74 @@
+from unittest import TestCase
+from unittest.mock import patch, MagicMock
+from mongoengine import NotUniqueError
+from volume_provider.models import DeviceReservation
+
+
+DEVICES = ['/dev/sdf', '/dev/sdg', '/dev/sdh']
+
+
+@patch('volume_provider.models.DeviceReservation.ensure_unique_index', new=MagicMock())
+@patch('volume_provider.models.DeviceReservation.save')
+@patch('volume_provider.models.Volume.raw_values', new=MagicMock(return_value=['/dev/sdf']))
+@patch('volume_provider.models.DeviceReservation.objects')
+class ReserveTestCase(TestCase):
+
+    def test_skips_devices_in_use(self, objects, save):
+        objects.return_value.only.return_value.as_pymongo.return_value = [
+            {'device': '/dev/sdg'}
+        ]
+
+        self.assertEqual(DeviceReservation.reserve('10.0.0.1', DEVICES), '/dev/sdh')
+        save.assert_called_once_with(force_insert=True)
+
+    def test_concurrent_reservation_takes_next(self, objects, save):
+        objects.return_value.only.return_value.as_pymongo.return_value = []
+        save.side_effect = [NotUniqueError, None]
+
+        self.assertEqual(DeviceReservation.reserve('10.0.0.1', DEVICES), '/dev/sdh')
+        self.assertEqual(save.call_count, 2)
+
+    def test_no_free_device(self, objects, save):
+        objects.return_value.only.return_value.as_pymongo.return_value = [
+            {'device': '/dev/sdg'}, {'device': '/dev/sdh'}
+        ]
+
+        self.assertIsNone(DeviceReservation.reserve('10.0.0.1', DEVICES))
+        self.assertFalse(save.called)
+
+
+@patch('volume_provider.models.DeviceReservation._get_collection')
+@patch('volume_provider.models.DeviceReservation.ensure_indexes')
+class EnsureUniqueIndexTestCase(TestCase):
+
+    def setUp(self):
+        DeviceReservation._index_checked = False
+
+    def tearDown(self):
+        DeviceReservation._index_checked = False
+
+    def test_created_once(self, ensure_indexes, get_collection):
+        get_collection().index_information.return_value = {
+            '_id_': {'key': [('_id', 1)]},
+            'owner_address_1_device_1': {
+                'key': [('owner_address', 1), ('device', 1)], 'unique': True
+            },
+        }
+
+        DeviceReservation.ensure_unique_index()
+        DeviceReservation.ensure_unique_index()
+        ensure_indexes.assert_called_once_with()
+
+    def test_missing_index_fails(self, ensure_indexes, get_collection):
+        get_collection().index_information.return_value = {
+            'owner_address_1_device_1': {'key': [('owner_address', 1), ('device', 1)]},
+        }
+
+        self.assertRaises(EnvironmentError, DeviceReservation.ensure_unique_index)
+        self.assertRaises(EnvironmentError, DeviceReservation.ensure_unique_index)
+        self.assertEqual(ensure_indexes.call_count, 2)
+
+    def test_index_creation_error_fails(self, ensure_indexes, get_collection):
+        ensure_indexes.side_effect = Exception('duplicate key')
+
+        self.assertRaises(Exception, DeviceReservation.ensure_unique_index)
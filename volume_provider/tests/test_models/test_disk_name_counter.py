@@ -0,0 +1,37 @@
+from unittest import TestCase
+from unittest.mock import patch, MagicMock, call
+from volume_provider.models import DiskNameCounter
+
+
+@patch('volume_provider.models.DiskNameCounter.seed')
+@patch('volume_provider.models.DiskNameCounter.objects')
+class NextValueTestCase(TestCase):
+
+    def test_increments_existing_counter(self, objects, seed):
+        objects.return_value.modify.side_effect = [None, MagicMock(value=5)]
+        load_seed = MagicMock()
+
+        self.assertEqual(DiskNameCounter.next_value('fake_group', load_seed), 5)
+        objects.return_value.modify.assert_called_with(new=True, inc__value=1)
+        objects.assert_called_with(group='fake_group')
+        self.assertFalse(load_seed.called)
+        self.assertFalse(seed.called)
+
+    def test_seeds_missing_counter(self, objects, seed):
+        objects.return_value.modify.side_effect = [None, None, MagicMock(value=4)]
+
+        self.assertEqual(DiskNameCounter.next_value('fake_group', lambda: 3), 4)
+        seed.assert_called_once_with('fake_group', 3)
+
+    def test_reuses_released_number(self, objects, seed):
+        objects.return_value.modify.return_value = MagicMock(free=[2, 7])
+
+        self.assertEqual(DiskNameCounter.next_value('fake_group', MagicMock()), 2)
+        objects.assert_called_once_with(group='fake_group', free__0__exists=True)
+        objects.return_value.modify.assert_called_once_with(pop__free=-1)
+
+    def test_release(self, objects, seed):
+        DiskNameCounter.release('fake_group', 3)
+
+        self.assertEqual(objects.call_args, call(group='fake_group'))
+        objects.return_value.update_one.assert_called_once_with(add_to_set__free=3)
@@ -0,0 +1,91 @@
+from unittest import TestCase
+from unittest.mock import patch, MagicMock
+
+from mongoengine import connect
+from volume_provider.models import Volume, Snapshot, DeviceReservation, create_indexes
+from volume_provider.settings import MONGODB_DB, MONGODB_PARAMS
+
+
+connect(MONGODB_DB, **MONGODB_PARAMS)
+
+
+def winning_stages(explain):
+    stages = []
+    plan = explain['queryPlanner']['winningPlan']
+    plan = plan.get('queryPlan', plan)
+    while plan:
+        stages.append(plan['stage'])
+        plan = plan.get('inputStage')
+    return stages
+
+
+class IndexesTestCase(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        _, errors = create_indexes()
+        if errors:
+            raise errors.popitem()[1]
+
+    def assertUsesIndex(self, queryset):
+        stages = winning_stages(queryset.explain())
+        self.assertIn('IXSCAN', stages)
+        self.assertNotIn('COLLSCAN', stages)
+
+    def test_volume_lookups(self):
+        self.assertUsesIndex(Volume.objects(identifier='fake-identifier'))
+        self.assertUsesIndex(Volume.objects(group='fake-group'))
+        self.assertUsesIndex(Volume.objects(owner_address='10.0.0.1'))
+        self.assertUsesIndex(Volume.objects(vm_name='fake-vm'))
+        self.assertUsesIndex(Volume.objects(labels__team_slug_name='fake-team'))
+
+    def test_snapshot_lookups(self):
+        volume = Volume(id='5f0000000000000000000001')
+        self.assertUsesIndex(Snapshot.objects(identifier='fake-identifier'))
+        self.assertUsesIndex(Snapshot.objects(volume=volume))
+
+    def test_device_reservation_lookup(self):
+        self.assertUsesIndex(DeviceReservation.objects(owner_address='10.0.0.1'))
+
+    def test_snapshot_identifier_not_unique(self):
+        indexes = Snapshot._get_collection().index_information()
+        self.assertFalse([index for index in indexes.values() if index.get('unique')])
+
+
+@patch('volume_provider.models.DeviceReservation.ensure_indexes')
+@patch('volume_provider.models.Operation.ensure_indexes')
+@patch('volume_provider.models.Volume.ensure_indexes')
+@patch('volume_provider.models.Snapshot.ensure_indexes')
+@patch('volume_provider.models.Snapshot.drop_unique_identifier_index')
+class CreateIndexesTestCase(TestCase):
+
+    def test_failure_does_not_stop_other_models(
+            self, drop_unique, snapshot, volume, operation, reservation):
+        operation.side_effect = Exception('fail')
+
+        collections, errors = create_indexes()
+
+        self.assertEqual(collections, ['device_reservation', 'volume', 'snapshot'])
+        self.assertEqual(list(errors), ['operation'])
+        drop_unique.assert_called_once_with()
+
+
+@patch('volume_provider.models.Snapshot._get_collection')
+class DropUniqueIdentifierIndexTestCase(TestCase):
+
+    def test_drops_unique_identifier(self, get_collection):
+        get_collection().index_information.return_value = {
+            '_id_': {'key': [('_id', 1)]},
+            'identifier_1': {'key': [('identifier', 1)], 'unique': True},
+        }
+
+        self.assertTrue(Snapshot.drop_unique_identifier_index())
+        get_collection().drop_index.assert_called_once_with('identifier_1')
+
+    def test_keeps_non_unique(self, get_collection):
+        get_collection().index_information.return_value = {
+            'identifier_1': {'key': [('identifier', 1)]},
+        }
+
+        self.assertFalse(Snapshot.drop_unique_identifier_index())
+        self.assertFalse(get_collection().drop_index.called)
@@ -0,0 +1,63 @@
+from datetime import datetime, timedelta
+from unittest import TestCase
+
+from bson import ObjectId
+from mongoengine import connect
+from volume_provider.models import Volume, Snapshot
+from volume_provider.settings import MONGODB_DB, MONGODB_PARAMS
+
+
+connect(MONGODB_DB, **MONGODB_PARAMS)
+
+
+class CursorTestCase(TestCase):
+
+    def test_cursor_round_trip(self):
+        snapshot = Snapshot(
+            id=ObjectId('5f0000000000000000000001'),
+            created_at=datetime(2020, 5, 1, 10, 30, 0, 123000)
+        )
+        cursor = Snapshot.encode_cursor(snapshot)
+
+        self.assertEqual(
+            Snapshot.decode_cursor(cursor), (snapshot.created_at, snapshot.pk)
+        )
+
+    def test_cursor_without_created_at(self):
+        snapshot = Snapshot(id=ObjectId('5f0000000000000000000001'))
+        cursor = Snapshot.encode_cursor(snapshot)
+
+        self.assertEqual(Snapshot.decode_cursor(cursor), (None, snapshot.pk))
+
+    def test_invalid_cursor(self):
+        self.assertRaises(ValueError, Snapshot.decode_cursor, 'invalid')
+
+
+class PageTestCase(TestCase):
+
+    def setUp(self):
+        self.volume = Volume(
+            size_kb=1024, group='fake_group', resource_id='fake_resource',
+            identifier='fake_page_volume', path='/dev/fake', owner_address='10.0.0.1'
+        ).save()
+        now = datetime(2020, 1, 1)
+        for day in range(5):
+            Snapshot(
+                volume=self.volume, identifier='fake_page_snap{}'.format(day),
+                description='snap{}'.format(day), created_at=now + timedelta(days=day)
+            ).save()
+
+    def tearDown(self):
+        Snapshot.objects(volume=self.volume).delete()
+        self.volume.delete()
+
+    def test_pages(self):
+        first, cursor = Snapshot.page(self.volume, 2)
+        second, cursor = Snapshot.page(self.volume, 2, cursor)
+        last, cursor = Snapshot.page(self.volume, 2, cursor)
+
+        self.assertEqual(
+            [snap.description for snap in first + second + last],
+            ['snap4', 'snap3', 'snap2', 'snap1', 'snap0']
+        )
+        self.assertIsNone(cursor)
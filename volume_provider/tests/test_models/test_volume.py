@@ -50,4 +50,46 @@ class PropertiesTestCase(TestCase):
         vol = Volume(**self.volume_dct)
         vol.size_kb = 892014234
 
-        self.assertEqual(vol.convert_kb_to_gb(vol.size_kb), 851)
\ No newline at end of file
+        self.assertEqual(vol.convert_kb_to_gb(vol.size_kb), 851)
+
+    def test_normalize_path(self):
+        self.assertEqual(
+            Volume.normalize_path('/dev/disk/by-id/Google-Disk1'),
+            ('/dev/disk/by-id/google-disk1', 'google-disk1')
+        )
+        self.assertEqual(Volume.normalize_path('/'), ('/', None))
+        self.assertEqual(Volume.normalize_path(None), (None, None))
+
+    def test_clean_sets_normalized_path(self):
+        vol = Volume(**self.volume_dct)
+        vol.clean()
+
+        self.assertEqual(vol.path_lower, '/path/to/volume')
+        self.assertEqual(vol.device, 'volume')
+
+    def test_find_raw_matches_get_json(self):
+        self.volume_dct.pop('id')
+        vol = Volume(**self.volume_dct)
+        vol.save()
+
+        self.assertEqual(Volume.find_raw(pk=vol.pk), vol.get_json)
+        self.assertEqual(
+            Volume.find_raw(('path', 'zone'), pk=vol.pk),
+            {'path': vol.path, 'zone': vol.zone}
+        )
+        self.assertIsNone(Volume.find_raw(pk=bson.ObjectId()))
+
+        Volume(**self.volume_dct).save()
+        with self.assertRaises(Volume.MultipleObjectsReturned):
+            Volume.find_raw(device=vol.device)
+
+    def test_created_after(self):
+        self.volume_dct.pop('id')
+        newest_id = Volume.newest_id()
+        if newest_id:
+            self.assertFalse(Volume.created_after(newest_id))
+
+        vol = Volume(**self.volume_dct)
+        vol.save()
+        self.assertTrue(Volume.created_after(newest_id))
+        self.assertEqual(Volume.newest_id(), vol.pk)
@@ -1,10 +1,12 @@
+import requests
 from unittest import TestCase
 from unittest.mock import patch
 from collections import namedtuple
 from copy import deepcopy
 from libcloud import security
 
-from volume_provider.providers.base import ProviderBase
+from volume_provider.models import Volume
+from volume_provider.providers.base import ProviderBase, MISSING_VOLUMES, forget_missing_volumes
 from volume_provider.providers import base
 from volume_provider.tests.test_credentials import CredentialAddFake, FakeMongoDB
 from volume_provider.providers import ProviderGce
@@ -100,6 +102,249 @@ class TestBaseProvider(TestCase):
             self.assertNotIn(full_data, FakeMongoDB.metadata)
             self.assertEqual(FakeMongoDB.ids[-1], latest)
 
+@patch('dbaas_base_provider.team.TeamClient.make_labels')
+class TestTeamLabels(TestCase):
+
+    def setUp(self):
+        base.TEAM_LABELS.clear()
+        self.provider = FakeProvider(ENVIRONMENT, ENGINE)
+        self.team_api = patch('volume_provider.providers.base.DBAAS_TEAM_API_URL', None)
+        self.team_api.start()
+
+    def tearDown(self):
+        self.team_api.stop()
+        base.TEAM_LABELS.clear()
+
+    def team_labels(self, make_labels):
+        make_labels.return_value = {
+            'team_slug_name': 'fake-team', 'team_id': '1',
+            'created_at': 'old', 'engine': '', 'database_name': '',
+        }
+
+    def test_team_fetched_once(self, make_labels):
+        self.team_labels(make_labels)
+        self.provider.get_team_labels_formatted('fake-team', 'infra1', 'db1', 'redis')
+        labels = self.provider.get_team_labels_formatted('fake-team', 'infra2', 'db2', 'mongodb')
+
+        self.assertEqual(make_labels.call_count, 1)
+        self.assertEqual(labels['team_slug_name'], 'fake-team')
+        self.assertEqual(labels['infra_name'], 'infra2')
+        self.assertEqual(labels['database_name'], 'db2')
+        self.assertEqual(labels['engine'], 'mongodb')
+        self.assertNotEqual(labels['created_at'], 'old')
+
+    @patch('volume_provider.utils.cache.Thread')
+    @patch('volume_provider.utils.cache.time')
+    def test_stale_served_while_refreshing(self, time_mock, thread, make_labels):
+        self.team_labels(make_labels)
+        time_mock.return_value = 100
+        self.provider.get_team_labels_formatted('fake-team')
+
+        time_mock.return_value = 100 + base.TEAM_LABELS.fresh_ttl
+        labels = self.provider.get_team_labels_formatted('fake-team')
+
+        self.assertEqual(labels['team_id'], '1')
+        self.assertEqual(make_labels.call_count, 1)
+        self.assertTrue(thread().start.called)
+
+    @patch('volume_provider.utils.cache.time')
+    def test_expired_loaded_again(self, time_mock, make_labels):
+        self.team_labels(make_labels)
+        time_mock.return_value = 100
+        self.provider.get_team_labels_formatted('fake-team')
+
+        time_mock.return_value = 100 + base.TEAM_LABELS.ttl
+        self.provider.get_team_labels_formatted('fake-team')
+
+        self.assertEqual(make_labels.call_count, 2)
+
+    @patch('volume_provider.utils.sessions.requests.Session.get')
+    def test_team_api(self, session_get, make_labels):
+        session_get.return_value = MagicMock(status_code=200)
+        session_get.return_value.json.return_value = {
+            'business_service': 'service', 'client': 'client',
+            'slug': 'fake-team', 'identifier': '1',
+        }
+        with patch('volume_provider.providers.base.DBAAS_TEAM_API_URL', 'http://fake/team/'):
+            labels = self.provider.get_team_labels_formatted('fake-team')
+
+        self.assertEqual(labels['team_slug_name'], 'fake-team')
+        self.assertFalse(make_labels.called)
+        self.assertEqual(session_get.call_args[0][0], 'http://fake/team/fake-team')
+        self.assertIn('timeout', session_get.call_args[1])
+
+    @patch('volume_provider.utils.sessions.requests.Session.get')
+    def test_team_api_unavailable(self, session_get, make_labels):
+        self.team_labels(make_labels)
+        session_get.side_effect = requests.ConnectionError()
+        with patch('volume_provider.providers.base.DBAAS_TEAM_API_URL', 'http://fake/team/'):
+            labels = self.provider.get_team_labels_formatted('fake-team')
+
+        self.assertEqual(labels['team_slug_name'], 'fake-team')
+        self.assertTrue(make_labels.called)
+
+
+class TestBulkSnapshot(TestCase):
+
+    def setUp(self):
+        self.provider = FakeProvider(ENVIRONMENT, ENGINE)
+
+    @patch('volume_provider.providers.base.ProviderBase.take_snapshot')
+    def test_take_snapshots(self, take_snapshot):
+        error = Exception('Volume not found')
+        take_snapshot.side_effect = lambda identifier, *args: (
+            identifier.upper() if identifier != 'missing' else self._raise(error)
+        )
+        results = self.provider.take_snapshots(
+            ['vol1', 'missing', 'vol2'], 'fake-team', ENGINE, 'fake_db', True
+        )
+
+        self.assertEqual(results, [
+            ('vol1', 'VOL1', None), ('missing', None, error), ('vol2', 'VOL2', None)
+        ])
+        take_snapshot.assert_any_call('vol1', 'fake-team', ENGINE, 'fake_db', True)
+        self.assertEqual(self.provider._client, 'FakeClient')
+
+    @patch('volume_provider.providers.base.ProviderBase.take_snapshot', new=MagicMock())
+    def test_take_snapshots_keeps_client(self):
+        client = MagicMock()
+        self.provider._client = client
+        self.provider.take_snapshots(['vol1'], 'fake-team', ENGINE, 'fake_db')
+
+        self.assertIs(self.provider._client, client)
+
+    def test_take_snapshots_empty(self):
+        self.assertEqual(self.provider.take_snapshots([], None, None, None), [])
+
+    @staticmethod
+    def _raise(error):
+        raise error
+
+
+@patch('volume_provider.providers.base.Volume.created_after', return_value=False)
+@patch('volume_provider.providers.base.Volume.newest_id', return_value='id1')
+@patch('volume_provider.providers.base.Volume.objects')
+class TestGetVolume(TestCase):
+
+    def setUp(self):
+        self.provider = FakeProvider(ENVIRONMENT, ENGINE)
+        MISSING_VOLUMES.clear()
+
+    def tearDown(self):
+        MISSING_VOLUMES.clear()
+
+    def test_by_device(self, objects, newest_id, created_after):
+        volume = MagicMock()
+        objects.return_value.get.side_effect = [
+            Volume.DoesNotExist, Volume.DoesNotExist, volume
+        ]
+
+        self.assertIs(self.provider.get_volume('Google-Disk1'), volume)
+        objects.assert_called_with(device='google-disk1')
+        self.assertFalse(newest_id.called)
+
+    def test_ambiguous_device_ignored(self, objects, newest_id, created_after):
+        objects.return_value.get.side_effect = [
+            Volume.DoesNotExist, Volume.DoesNotExist, Volume.MultipleObjectsReturned,
+            Volume.DoesNotExist
+        ]
+
+        self.assertIsNone(self.provider.get_volume('xvdf'))
+        objects.assert_called_with(path_lower=None, path__icontains='xvdf')
+
+    def test_not_normalized_volume(self, objects, newest_id, created_after):
+        volume = MagicMock()
+        objects.return_value.get.side_effect = [Volume.DoesNotExist] * 3 + [volume]
+
+        self.assertIs(self.provider.get_volume('Google-Disk1'), volume)
+        objects.assert_called_with(path_lower=None, path__icontains='Google-Disk1')
+
+    def test_missing_cached(self, objects, newest_id, created_after):
+        objects.return_value.get.side_effect = Volume.DoesNotExist
+
+        self.assertIsNone(self.provider.get_volume('fake-disk'))
+        self.assertIsNone(self.provider.get_volume('fake-disk'))
+        self.assertEqual(objects.call_count, 4)
+        newest_id.assert_called_once_with()
+        created_after.assert_called_once_with('id1')
+
+    def test_missing_forgotten_when_a_volume_is_created(self, objects, newest_id, created_after):
+        objects.return_value.get.side_effect = Volume.DoesNotExist
+        self.provider.get_volume('fake-disk')
+        created_after.return_value = True
+
+        self.provider.get_volume('fake-disk')
+        self.assertEqual(objects.call_count, 8)
+
+    def test_missing_forgotten_on_save(self, objects, newest_id, created_after):
+        objects.return_value.get.side_effect = Volume.DoesNotExist
+        self.provider.get_volume('fake-disk')
+        forget_missing_volumes(Volume, document=Volume())
+
+        self.provider.get_volume('fake-disk')
+        self.assertEqual(objects.call_count, 8)
+
+
+@patch('volume_provider.providers.base.Volume.created_after', new=MagicMock(return_value=False))
+@patch('volume_provider.providers.base.Volume.newest_id', new=MagicMock(return_value='id1'))
+@patch('volume_provider.providers.base.Volume.find_raw')
+class TestGetVolumeData(TestCase):
+
+    def setUp(self):
+        self.provider = FakeProvider(ENVIRONMENT, ENGINE)
+        MISSING_VOLUMES.clear()
+
+    def tearDown(self):
+        MISSING_VOLUMES.clear()
+
+    def test_by_path(self, find_raw):
+        data = {'identifier': 'fake-id'}
+        find_raw.side_effect = [None, data]
+
+        self.assertIs(
+            self.provider.get_volume_data('/Dev/Disk1', ('identifier',)), data
+        )
+        find_raw.assert_called_with(('identifier',), path_lower='/dev/disk1')
+
+    def test_ambiguous_device_ignored(self, find_raw):
+        find_raw.side_effect = [None, None, Volume.MultipleObjectsReturned, None]
+
+        self.assertIsNone(self.provider.get_volume_data('xvdf'))
+        self.assertEqual(find_raw.call_count, 4)
+
+    def test_missing_cached(self, find_raw):
+        find_raw.return_value = None
+
+        self.assertIsNone(self.provider.get_volume_data('fake-disk'))
+        self.assertIsNone(self.provider.get_volume_data('fake-disk'))
+        self.assertEqual(find_raw.call_count, 4)
+
+
+@patch('volume_provider.providers.base.Snapshot.objects')
+class TestSnapshotsFrom(TestCase):
+
+    def setUp(self):
+        self.provider = FakeProvider(ENVIRONMENT, ENGINE)
+
+    def test_without_offset(self, objects):
+        snaps = self.provider.get_snapshots_from(volume='fake_volume')
+
+        self.assertIs(snaps, objects.filter.return_value)
+        objects.filter.assert_called_once_with(volume='fake_volume')
+
+    def test_offset_limits_cursor(self, objects):
+        objects.filter.return_value.count.return_value = 5
+        snaps = self.provider.get_snapshots_from(offset=2, volume='fake_volume')
+
+        objects.filter.return_value.limit.assert_called_once_with(3)
+        self.assertIs(snaps, objects.filter.return_value.limit.return_value)
+
+    def test_offset_bigger_than_count(self, objects):
+        objects.filter.return_value.count.return_value = 2
+
+        self.assertEqual(self.provider.get_snapshots_from(offset=2, volume='fake'), [])
+
+
 class GCPBaseTestCase(TestCase):
     def setUp(self):
         self.provider = ProviderGce(ENVIRONMENT, ENGINE)
@@ -0,0 +1,217 @@
+from unittest import TestCase
+from unittest.mock import patch, MagicMock
+
+from libcloud.common.exceptions import BaseHTTPError
+
+from volume_provider.providers.aws import ProviderAWS, DRIVERS
+
+
+ENVIRONMENT = "dev"
+ENGINE = "redis"
+FAKE_CREDENTIAL = {
+    "provider": "ebs",
+    "environment": ENVIRONMENT,
+    "access_id": "fake_access_id",
+    "secret_key": "fake_secret_key",
+    "region": "fake-region-1",
+    "ebs_type": "gp2",
+}
+
+
+@patch('volume_provider.providers.aws.CredentialAWS.get_content',
+       new=MagicMock(return_value=FAKE_CREDENTIAL))
+@patch('volume_provider.providers.aws.ProviderAWS._build_client')
+class DriverPoolTestCase(TestCase):
+
+    def setUp(self):
+        DRIVERS.clear()
+
+    def tearDown(self):
+        DRIVERS.clear()
+
+    def test_driver_reused_after_release(self, build_client):
+        build_client.side_effect = lambda: MagicMock()
+        provider = ProviderAWS(ENVIRONMENT, ENGINE)
+        driver = provider.client
+        provider.release()
+
+        other_provider = ProviderAWS(ENVIRONMENT, ENGINE)
+        self.assertIs(other_provider.client, driver)
+        self.assertEqual(build_client.call_count, 1)
+
+    def test_driver_not_shared_while_in_use(self, build_client):
+        build_client.side_effect = lambda: MagicMock()
+        driver = ProviderAWS(ENVIRONMENT, ENGINE).client
+
+        self.assertIsNot(ProviderAWS(ENVIRONMENT, ENGINE).client, driver)
+        self.assertEqual(build_client.call_count, 2)
+
+    def test_credential_change_evicts_drivers(self, build_client):
+        build_client.side_effect = lambda: MagicMock()
+        provider = ProviderAWS(ENVIRONMENT, ENGINE)
+        driver = provider.client
+        provider.release()
+
+        with patch('volume_provider.providers.base.BaseProvider.credential_add',
+                   new=MagicMock(return_value=(True, 1))):
+            provider.credential_add(FAKE_CREDENTIAL)
+
+        self.assertIsNot(ProviderAWS(ENVIRONMENT, ENGINE).client, driver)
+
+
+@patch('volume_provider.providers.aws.CredentialAWS.get_content',
+       new=MagicMock(return_value=FAKE_CREDENTIAL))
+@patch('volume_provider.credentials.aws.DeviceReservation')
+class DeviceTestCase(TestCase):
+
+    def setUp(self):
+        self.provider = ProviderAWS(ENVIRONMENT, ENGINE)
+
+    def test_next_device_reserves(self, reservation):
+        reservation.reserve.return_value = '/dev/sdg'
+
+        self.assertEqual(self.provider.credential.next_device('10.0.0.1'), '/dev/sdg')
+        owner_address, devices = reservation.reserve.call_args[0]
+        self.assertEqual(owner_address, '10.0.0.1')
+        self.assertEqual(devices[0], '/dev/sdf')
+
+    def test_next_device_without_free_device(self, reservation):
+        reservation.reserve.return_value = None
+
+        self.assertRaises(
+            EnvironmentError, self.provider.credential.next_device, '10.0.0.1'
+        )
+
+    def test_move_device_keeps_device_when_free(self, reservation):
+        reservation.reserve.return_value = '/dev/sdg'
+
+        device = self.provider.credential.move_device('10.0.0.1', '10.0.0.2', '/dev/sdg')
+
+        self.assertEqual(device, '/dev/sdg')
+        self.assertEqual(reservation.reserve.call_args[0][1][0], '/dev/sdg')
+        reservation.release.assert_called_once_with('10.0.0.1', '/dev/sdg')
+
+    def test_move_device_without_free_device(self, reservation):
+        reservation.reserve.return_value = None
+
+        self.assertRaises(
+            EnvironmentError,
+            self.provider.credential.move_device, '10.0.0.1', '10.0.0.2', '/dev/sdg'
+        )
+        self.assertFalse(reservation.release.called)
+
+    def test_add_access_moves_reservation(self, reservation):
+        reservation.reserve.return_value = '/dev/sdh'
+        volume = MagicMock(owner_address='10.0.0.1', path='/dev/sdg')
+
+        self.provider._add_access(volume, '10.0.0.2')
+
+        self.assertEqual(volume.path, '/dev/sdh')
+        self.assertEqual(volume.owner_address, '10.0.0.2')
+        reservation.release.assert_called_once_with('10.0.0.1', '/dev/sdg')
+        self.assertTrue(volume.save.called)
+
+    def test_add_access_same_host(self, reservation):
+        volume = MagicMock(owner_address='10.0.0.1', path='/dev/sdg')
+
+        self.provider._add_access(volume, '10.0.0.1')
+
+        self.assertFalse(reservation.reserve.called)
+        self.assertFalse(reservation.release.called)
+
+    @patch('volume_provider.providers.base.Volume')
+    def test_failed_create_releases_device(self, volume_class, reservation):
+        volume = volume_class.return_value
+        volume.path = None
+        volume.save.side_effect = Exception('save failed')
+
+        def create(volume, *args, **kwargs):
+            volume.path = '/dev/sdg'
+
+        with patch.object(ProviderAWS, '_create_volume', side_effect=create):
+            self.assertRaises(
+                Exception, self.provider.create_volume, 'fake_group', 1024, '10.0.0.1'
+            )
+
+        reservation.release.assert_called_once_with('10.0.0.1', '/dev/sdg')
+
+    @patch('volume_provider.providers.aws.ProviderAWS._build_client', new=MagicMock())
+    def test_delete_releases_device(self, reservation):
+        volume = MagicMock(snapshots=[], owner_address='10.0.0.1', path='/dev/sdg')
+        with patch.object(ProviderAWS, '_ProviderAWS__get_ebs'), \
+                patch.object(ProviderAWS, '_ProviderAWS__detach_volume'):
+            self.provider._delete_volume(volume)
+
+        reservation.release.assert_called_once_with('10.0.0.1', '/dev/sdg')
+
+
+@patch('volume_provider.providers.aws.CredentialAWS.get_content',
+       new=MagicMock(return_value=FAKE_CREDENTIAL))
+@patch('volume_provider.providers.aws.ProviderAWS._build_client')
+class EbsLookupTestCase(TestCase):
+
+    def setUp(self):
+        DRIVERS.clear()
+        self.provider = ProviderAWS(ENVIRONMENT, ENGINE)
+        self.volume = MagicMock(identifier='vol-1')
+
+    def tearDown(self):
+        DRIVERS.clear()
+
+    def test_get_ebs_filters_by_id_once_per_request(self, build_client):
+        client = build_client.return_value
+        client.list_volumes.return_value = [MagicMock(id='vol-1')]
+
+        ebs = self.provider._ProviderAWS__get_ebs(self.volume)
+        self.assertIs(self.provider._ProviderAWS__get_ebs(self.volume), ebs)
+        client.list_volumes.assert_called_once_with(ex_filters={'volume-id': 'vol-1'})
+
+        self.provider.release()
+        self.provider._ProviderAWS__get_ebs(self.volume)
+        self.assertEqual(client.list_volumes.call_count, 2)
+
+    def test_get_ebs_not_found(self, build_client):
+        build_client.return_value.list_volumes.return_value = []
+
+        self.assertIsNone(self.provider._ProviderAWS__get_ebs(self.volume))
+
+    @patch('volume_provider.providers.aws.wait_for',
+           new=lambda probe, name, timeout: probe() or probe())
+    def test_waiting_refreshes_state(self, build_client):
+        client = build_client.return_value
+        client.list_volumes.side_effect = [
+            [MagicMock(state='creating')], [MagicMock(state='available')]
+        ]
+
+        self.assertTrue(self.provider.waiting_be('available', self.volume))
+        self.assertEqual(client.list_volumes.call_count, 2)
+
+    def test_get_snapshot_by_id(self, build_client):
+        client = build_client.return_value
+        ebs_snapshot = MagicMock(id='snap-1')
+        client.list_snapshots.return_value = [ebs_snapshot]
+        snapshot = MagicMock(identifier='snap-1')
+
+        self.assertIs(self.provider._ProviderAWS__get_snapshot(snapshot), ebs_snapshot)
+        self.assertEqual(client.list_snapshots.call_args[1]['snapshot'].id, 'snap-1')
+        self.assertFalse(client.list_volumes.called)
+
+    def test_removed_snapshot_not_found(self, build_client):
+        build_client.return_value.list_snapshots.side_effect = BaseHTTPError(
+            400, "InvalidSnapshot.NotFound: The snapshot 'snap-1' does not exist."
+        )
+        snapshot = MagicMock(identifier='snap-1')
+
+        self.assertTrue(self.provider._remove_snapshot(snapshot, False))
+        self.assertRaises(
+            EnvironmentError, self.provider._ProviderAWS__get_snapshot, snapshot
+        )
+
+    def test_snapshot_lookup_error(self, build_client):
+        build_client.return_value.list_snapshots.side_effect = BaseHTTPError(
+            503, "RequestLimitExceeded: Request limit exceeded."
+        )
+
+        self.assertRaises(
+            BaseHTTPError, self.provider._ProviderAWS__get_snapshot, MagicMock()
+        )
@@ -1,9 +1,11 @@
+import socket
 from copy import deepcopy
+from datetime import datetime, timedelta
 from unittest import TestCase
 from unittest.mock import patch, MagicMock, PropertyMock
-from volume_provider.providers.gce import ProviderGce
+from volume_provider.providers.gce import ProviderGce, CLIENTS
 from volume_provider.credentials.gce import CredentialAddGce
-from volume_provider.models import Volume
+from volume_provider.models import Volume, Snapshot
 from .fakes.gce import FAKE_CREDENTIAL, FAKE_DISK_LIST, FAKE_TAGS
 from .base import GCPBaseTestCase
 
@@ -49,6 +51,25 @@ class TestCredentialGCE(GCPBaseTestCase):
             googleapiclient.discovery.Resource
         )
 
+    @patch('volume_provider.providers.gce.ProviderGce._build_client')
+    @patch(
+        'volume_provider.providers.gce.CredentialGce.get_content'
+    )
+    def test_build_client_cached(self, content, build_client):
+        self.build_credential_content(content)
+        build_client.side_effect = lambda: object()
+        CLIENTS.clear()
+
+        client = self.provider.build_client()
+        other_provider = ProviderGce(ENVIRONMENT, ENGINE)
+        self.assertIs(other_provider.build_client(), client)
+        self.assertEqual(build_client.call_count, 1)
+
+        self.build_credential_content(content, project='other-project')
+        other_provider = ProviderGce(ENVIRONMENT, ENGINE)
+        self.assertIsNot(other_provider.build_client(), client)
+        self.assertEqual(build_client.call_count, 2)
+
     def build_credential_content(self, content, **kwargs):
         values = deepcopy(FAKE_CREDENTIAL)
         values.update(kwargs)
@@ -64,18 +85,60 @@ class TestCredentialGCE(GCPBaseTestCase):
        new=MagicMock(return_value={'status': 'READY'}))
 class CreateVolumeTestCase(GCPBaseTestCase):
 
+    @patch('volume_provider.providers.gce.DiskNameCounter.next_value',
+           new=lambda group, seed: seed() + 1)
     @patch('volume_provider.providers.gce.ProviderGce._get_volumes',
            new=MagicMock(return_value=FAKE_DISK_LIST))
     def test_get_disk_name(self, client_mock):
         disk_name = self.provider._get_new_disk_name(self.disk)
         self.assertEqual(disk_name, 'fake_group-data3')
 
+    @patch('volume_provider.providers.gce.DiskNameCounter.next_value',
+           new=lambda group, seed: seed() + 1)
     @patch('volume_provider.providers.gce.ProviderGce._get_volumes',
            new=MagicMock(return_value=[]))
     def test_get_disk_name_first_disk(self, client_mock):
         disk_name = self.provider._get_new_disk_name(self.disk)
         self.assertEqual(disk_name, 'fake_group-data1')
 
+    @patch('volume_provider.providers.gce.DiskNameCounter.release')
+    def test_failed_create_releases_disk_number(self, release, client_mock):
+        self.disk.resource_id = 'fake_group-data4'
+        self.provider._create_volume_failed(self.disk)
+
+        release.assert_called_once_with(self.disk.group, 4)
+
+    @patch('volume_provider.providers.gce.DiskNameCounter.release')
+    @patch('volume_provider.providers.gce.ProviderGce._get_new_disk_name',
+           new=MagicMock(side_effect=Exception('counter unavailable')))
+    def test_failed_allocation_releases_nothing(self, release, client_mock):
+        self.disk.resource_id = 'fake_group-data1'
+        self.assertRaises(Exception, self.provider._create_volume, self.disk)
+        self.provider._create_volume_failed(self.disk)
+
+        self.assertFalse(release.called)
+
+    @patch('volume_provider.providers.gce.ProviderGce._get_volumes',
+           new=MagicMock(return_value=[
+               'fake_group-data10', 'fake_group-data9', 'fake_group-disk'
+           ]))
+    def test_last_disk_number_is_the_highest(self, client_mock):
+        self.assertEqual(self.provider._last_disk_number(self.disk), 10)
+
+    @patch('volume_provider.providers.gce.DiskNameCounter.seed')
+    @patch('volume_provider.providers.gce.Volume.objects')
+    def test_seed_disk_name_counters(self, objects, seed, client_mock):
+        objects.only.return_value.as_pymongo.return_value = [
+            {'group': 'g1', 'resource_id': 'g1-data2'},
+            {'group': 'g1', 'resource_id': 'g1-data7'},
+            {'group': 'g2', 'resource_id': 'vol-123'},
+            {'group': 'g3', 'resource_id': 'g3-data1'},
+        ]
+
+        self.assertEqual(ProviderGce.seed_disk_name_counters(), 2)
+        seed.assert_any_call('g1', 7)
+        seed.assert_any_call('g3', 1)
+
     @patch('dbaas_base_provider.baseProvider.BaseProvider.get_or_none_resource',
            new=MagicMock(return_value=None))
     @patch('volume_provider.providers.gce.ProviderGce._get_new_disk_name',
@@ -261,3 +324,351 @@ class GetOrNoneResourceCalled(GCPBaseTestCase):
     def test_get_or_none_on_delete_snapshot(self, client_mock, get_or_none):
         self.provider._remove_snapshot(self.snapshot)
         self.assertTrue(get_or_none.called)
+
+
+@patch('volume_provider.providers.gce.ProviderGce.build_client')
+@patch('volume_provider.providers.gce.CredentialGce.get_content',
+       new=MagicMock(return_value=FAKE_CREDENTIAL))
+@patch('volume_provider.providers.gce.POLLER')
+class WaitOperationTestCase(GCPBaseTestCase):
+
+    def test_server_side_wait(self, poller, client_mock):
+        wait = client_mock().zoneOperations().wait().execute
+        wait.side_effect = [
+            {'status': 'RUNNING'}, {'status': 'DONE', 'operationType': 'insert'}
+        ]
+        operation = self.provider._wait('fake-op', zone='fake_zone')
+
+        self.assertEqual(operation['status'], 'DONE')
+        self.assertEqual(wait.call_count, 2)
+        self.assertFalse(poller.wait.called)
+
+    def test_server_side_wait_again_after_socket_timeout(self, poller, client_mock):
+        wait = client_mock().zoneOperations().wait().execute
+        wait.side_effect = [
+            socket.timeout('timed out'), {'status': 'DONE', 'operationType': 'insert'}
+        ]
+        operation = self.provider._wait('fake-op', zone='fake_zone')
+
+        self.assertEqual(operation['status'], 'DONE')
+        self.assertEqual(wait.call_count, 2)
+        self.assertFalse(poller.wait.called)
+
+    def test_poll_when_server_side_wait_fails(self, poller, client_mock):
+        client_mock().zoneOperations().wait().execute.side_effect = Exception('fail')
+        poller.wait.return_value = {'status': 'DONE'}
+        operation = self.provider._wait('fake-op', zone='fake_zone')
+
+        self.assertEqual(operation, {'status': 'DONE'})
+        self.assertEqual(poller.wait.call_args[0][1:4], ('fake-project', 'fake_zone', 'fake-op'))
+
+    def test_poll_global_when_server_side_wait_fails(self, poller, client_mock):
+        client_mock().globalOperations().wait().execute.side_effect = Exception('fail')
+        get = client_mock().globalOperations().get().execute
+        get.return_value = {'status': 'DONE'}
+        operation = self.provider._wait('fake-op')
+
+        self.assertEqual(operation, {'status': 'DONE'})
+        self.assertFalse(poller.wait.called)
+
+
+@patch('volume_provider.providers.gce.ProviderGce.build_client')
+@patch('volume_provider.providers.gce.CredentialGce.get_content',
+       new=MagicMock(return_value=FAKE_CREDENTIAL))
+@patch('volume_provider.providers.gce.ProviderGce.get_team_labels_formatted',
+       new=MagicMock(return_value={}))
+@patch('volume_provider.providers.gce.ProviderGce._verify_persistent_backup_date',
+       new=MagicMock(return_value=False))
+class NewTakeSnapshotTestCase(GCPBaseTestCase):
+
+    def test_identifier_from_operation(self, client_mock):
+        insert = client_mock().snapshots().insert
+        insert().execute.return_value = {'targetId': '12345', 'status': 'RUNNING'}
+        with patch('dbaas_base_provider.baseProvider.BaseProvider.get_or_none_resource',
+                   new=MagicMock(return_value=None)) as get_or_none:
+            self.provider._new_take_snapshot(
+                self.disk, self.snapshot, 'fake_team', 'fake_engine', 'fake_db_name', False
+            )
+
+        self.assertEqual(self.snapshot.identifier, '12345')
+        self.assertEqual(get_or_none.call_count, 1)
+        body = insert.call_args[1]['body']
+        self.assertEqual(
+            body['sourceDisk'],
+            'projects/fake-project/zones/{}/disks/{}'.format(
+                self.disk.zone, self.disk.resource_id
+            )
+        )
+
+    @patch('volume_provider.utils.wait.sleep', new=MagicMock())
+    def test_identifier_from_get_without_target(self, client_mock):
+        client_mock().snapshots().insert().execute.return_value = {'status': 'RUNNING'}
+        with patch('dbaas_base_provider.baseProvider.BaseProvider.get_or_none_resource',
+                   new=MagicMock(side_effect=[None, {'id': '67890'}])):
+            self.provider._new_take_snapshot(
+                self.disk, self.snapshot, 'fake_team', 'fake_engine', 'fake_db_name', False
+            )
+
+        self.assertEqual(self.snapshot.identifier, '67890')
+
+
+class FakeBatch(object):
+
+    def __init__(self, callback, responses):
+        self.callback = callback
+        self.responses = responses
+        self.requests = []
+
+    def add(self, request, request_id):
+        self.requests.append(request_id)
+
+    def execute(self):
+        for request_id in self.requests:
+            response, exception = self.responses(request_id)
+            self.callback(request_id, response, exception)
+
+
+@patch('volume_provider.providers.gce.ProviderGce.build_client')
+@patch('volume_provider.providers.gce.CredentialGce.get_content',
+       new=MagicMock(return_value=FAKE_CREDENTIAL))
+@patch('volume_provider.providers.gce.GCE_BATCH_SIZE', new=2)
+class RemoveAllSnapshotsTestCase(GCPBaseTestCase):
+
+    def test_remove_all_snapshots(self, client_mock):
+        client = client_mock()
+        client.snapshots().list().execute.side_effect = [
+            {'items': [{'name': 'snap1'}, {'name': 'snap2'}], 'nextPageToken': 'next'},
+            {'items': [{'name': 'snap3'}]},
+        ]
+        client.snapshots().list_next.side_effect = [client.snapshots().list(), None]
+
+        deletes = {
+            'snap1': ({'name': 'op1'}, None),
+            'snap2': (None, Exception('Forbidden')),
+            'snap3': ({'name': 'op3'}, None),
+        }
+        operations = {
+            'snap1': ({'status': 'DONE'}, None),
+            'snap3': ({'status': 'DONE', 'error': {'errors': ['in use']}}, None),
+        }
+        batches = []
+
+        def new_batch(callback):
+            responses = deletes if len(batches) < 2 else operations
+            batches.append(FakeBatch(callback, responses.get))
+            return batches[-1]
+
+        client.new_batch_http_request.side_effect = new_batch
+        summary = self.provider._remove_all_snapshots('fake_group')
+
+        self.assertEqual(summary['found'], 3)
+        self.assertEqual(summary['removed'], ['snap1'])
+        self.assertEqual(set(summary['failed']), {'snap2', 'snap3'})
+        self.assertEqual([batch.requests for batch in batches], [
+            ['snap1', 'snap2'], ['snap3'], ['snap1', 'snap3']
+        ])
+
+    @patch('volume_provider.providers.gce.OPERATION_TIMEOUT', new=0)
+    def test_remove_all_snapshots_timeout(self, client_mock):
+        client = client_mock()
+        client.snapshots().list().execute.return_value = {
+            'items': [{'name': 'snap1'}, {'name': 'snap2'}]
+        }
+        client.snapshots().list_next.return_value = None
+
+        deletes = {
+            'snap1': ({'name': 'op1'}, None),
+            'snap2': ({'name': 'op2'}, None),
+        }
+        operations = {
+            'snap1': ({'status': 'DONE'}, None),
+            'snap2': ({'status': 'RUNNING'}, None),
+        }
+        batches = []
+
+        def new_batch(callback):
+            responses = deletes if not batches else operations
+            batches.append(FakeBatch(callback, responses.get))
+            return batches[-1]
+
+        client.new_batch_http_request.side_effect = new_batch
+        summary = self.provider._remove_all_snapshots('fake_group')
+
+        self.assertEqual(summary['removed'], ['snap1'])
+        self.assertEqual(list(summary['failed']), ['snap2'])
+        self.assertIn('Timeout', summary['failed']['snap2'])
+
+
+@patch('volume_provider.providers.gce.ProviderGce.build_client')
+@patch('volume_provider.providers.gce.CredentialGce.get_content',
+       new=MagicMock(return_value=FAKE_CREDENTIAL))
+@patch('dbaas_base_provider.baseProvider.BaseProvider.wait_operation',
+       new=MagicMock(return_value={'status': 'DONE'}))
+@patch('volume_provider.providers.gce.Volume.objects', new=MagicMock())
+class UpdateLabelsTestCase(GCPBaseTestCase):
+    team = {'team_slug_name': 'fake-team', 'team_id': '1'}
+
+    def test_labels_saved_on_volume(self, client_mock):
+        client_mock().disks().setLabels().execute.return_value = {'name': 'op'}
+        with patch('volume_provider.providers.gce.Volume.objects') as objects:
+            self.provider.update_labels(
+                'disk1', 'zone1', self.team, {'labelFingerprint': 'fp', 'labels': {}}
+            )
+
+        objects.assert_called_once_with(resource_id='disk1', zone='zone1')
+        update = objects.return_value.update.call_args[1]
+        self.assertEqual(update['set__labels__team_slug_name'], 'fake-team')
+        self.assertEqual(update['set__labels__team_id'], '1')
+
+    def test_error_not_saved_on_volume(self, client_mock):
+        client_mock().disks().setLabels().execute.side_effect = Exception('fail')
+        with patch('volume_provider.providers.gce.Volume.objects') as objects:
+            updated = self.provider.update_labels(
+                'disk1', 'zone1', self.team, {'labelFingerprint': 'fp', 'labels': {}}
+            )
+
+        self.assertFalse(updated)
+        self.assertFalse(objects.called)
+
+    def test_disks_read_in_batch(self, client_mock):
+        client = client_mock()
+        disks = {
+            '0': ({'labelFingerprint': 'fp0', 'labels': {'group': 'g'}}, None),
+            '1': ({'labelFingerprint': 'fp1', 'labels': {}}, None),
+        }
+        client.new_batch_http_request.side_effect = lambda callback: FakeBatch(
+            callback, disks.get
+        )
+        result = self.provider._update_disks_labels(
+            [('vm1', 'zone1'), ('disk1', 'zone1')], self.team
+        )
+
+        self.assertEqual(set(result), {'vm1', 'disk1'})
+        self.assertTrue(all(result.values()))
+        client.disks().get().execute.assert_not_called()
+        bodies = [c[1]['body'] for c in client.disks().setLabels.call_args_list if c[1]]
+        self.assertIn('fp0', [body['labelFingerprint'] for body in bodies])
+        self.assertTrue(all(
+            body['labels']['team_slug_name'] == 'fake-team' for body in bodies
+        ))
+
+    def test_fingerprint_conflict_read_again(self, client_mock):
+        client = client_mock()
+        conflict = googleapiclient.errors.HttpError(MagicMock(status=412), b'conflict')
+        client.disks().setLabels().execute.side_effect = [conflict, {'name': 'op'}]
+        client.disks().get().execute.return_value = {'labelFingerprint': 'new', 'labels': {}}
+
+        updated = self.provider.update_labels(
+            'disk1', 'zone1', self.team, {'labelFingerprint': 'old', 'labels': {}}
+        )
+
+        self.assertTrue(updated)
+        self.assertEqual(client.disks().get().execute.call_count, 1)
+        self.assertEqual(
+            client.disks().setLabels.call_args[1]['body']['labelFingerprint'], 'new'
+        )
+
+
+@patch('volume_provider.providers.gce.ProviderGce.build_client')
+@patch('volume_provider.providers.gce.CredentialGce.get_content',
+       new=MagicMock(return_value=FAKE_CREDENTIAL))
+class SnapshotsStatusTestCase(GCPBaseTestCase):
+
+    def test_one_list_call(self, client_mock):
+        client = client_mock()
+        client.snapshots().list().execute.return_value = {'items': [
+            {'id': '1', 'status': 'READY', 'downloadBytes': '10',
+             'labels': {'database_name': 'fake_db'}},
+            {'id': '2', 'status': 'CREATING', 'labels': {'database_name': 'fake_db'}},
+        ]}
+        client.snapshots().list_next.return_value = None
+        snapshots = [
+            MagicMock(identifier=identifier, status=None, pk=None) for identifier in ('1', '2', '3')
+        ]
+
+        states = self.provider._get_snapshots_status(snapshots)
+
+        self.assertEqual(states['1'], {
+            'id': '1', 'status': 'READY', 'db': 'fake_db', 'code': 200, 'size': '10'
+        })
+        self.assertEqual(states['2']['code'], 201)
+        self.assertEqual(states['3']['code'], 404)
+        self.assertEqual(
+            client.snapshots().list.call_args[1]['filter'],
+            '(id = "1") OR (id = "2") OR (id = "3")'
+        )
+        client.snapshots().get.assert_not_called()
+
+    def test_list_error(self, client_mock):
+        client_mock().snapshots().list().execute.side_effect = Exception('fail')
+        states = self.provider._get_snapshots_status(
+            [MagicMock(identifier='1', status=None, pk=None)]
+        )
+
+        self.assertEqual(states['1']['code'], 408)
+
+
+@patch('volume_provider.providers.gce.ProviderGce.build_client')
+@patch('volume_provider.providers.gce.CredentialGce.get_content',
+       new=MagicMock(return_value=FAKE_CREDENTIAL))
+@patch('volume_provider.providers.gce.Snapshot.objects')
+class StoredSnapshotStatusTestCase(GCPBaseTestCase):
+
+    def build_snapshot(self, status=None, checked_seconds_ago=0):
+        snapshot = Snapshot(
+            identifier='1', description='fake-snap', labels={'database_name': 'fake_db'}
+        )
+        snapshot.pk = '5f0000000000000000000001'
+        if status:
+            snapshot.status = status
+            snapshot.download_bytes = 10
+            snapshot.status_checked_at = datetime.now() - timedelta(seconds=checked_seconds_ago)
+        return snapshot
+
+    def test_final_status_from_document(self, objects, client_mock):
+        snapshot = self.build_snapshot('READY', checked_seconds_ago=3600)
+        state = self.provider._get_snapshot_status(snapshot)
+
+        self.assertEqual(state, {
+            'id': '1', 'status': 'READY', 'db': 'fake_db', 'code': 200, 'size': '10'
+        })
+        client_mock().snapshots().get.assert_not_called()
+
+    def test_recent_status_from_document(self, objects, client_mock):
+        snapshot = self.build_snapshot('CREATING', checked_seconds_ago=1)
+
+        self.assertEqual(self.provider._get_snapshot_status(snapshot)['code'], 201)
+        client_mock().snapshots().get.assert_not_called()
+
+    def test_old_status_refreshed_and_saved(self, objects, client_mock):
+        snapshot = self.build_snapshot('CREATING', checked_seconds_ago=3600)
+        client_mock().snapshots().get().execute.return_value = {
+            'id': '1', 'status': 'READY', 'downloadBytes': '20', 'storageBytes': '5',
+            'labels': {'database_name': 'fake_db'}
+        }
+        state = self.provider._get_snapshot_status(snapshot)
+
+        self.assertEqual(state['size'], '20')
+        self.assertEqual(snapshot.status, 'READY')
+        self.assertEqual(snapshot.storage_bytes, 5)
+        objects.return_value.update.assert_called_once_with(
+            set__status='READY', set__download_bytes=20, set__storage_bytes=5,
+            set__status_checked_at=snapshot.status_checked_at
+        )
+
+    def test_bulk_lists_only_pending(self, objects, client_mock):
+        client = client_mock()
+        client.snapshots().list().execute.return_value = {'items': [
+            {'id': '2', 'status': 'READY', 'labels': {'database_name': 'fake_db'}}
+        ]}
+        client.snapshots().list_next.return_value = None
+        ready = self.build_snapshot('READY', checked_seconds_ago=3600)
+        pending = self.build_snapshot()
+        pending.identifier = '2'
+
+        states = self.provider._get_snapshots_status([ready, pending])
+
+        self.assertEqual(states['1']['code'], 200)
+        self.assertEqual(states['2']['code'], 200)
+        self.assertEqual(client.snapshots().list.call_args[1]['filter'], '(id = "2")')
+        self.assertEqual(pending.status, 'READY')
@@ -0,0 +1,42 @@
+from unittest import TestCase
+from unittest.mock import patch, MagicMock
+
+from volume_provider.providers.k8s import ProviderK8s, CLIENTS
+
+
+ENVIRONMENT = "dev"
+AUTH_INFO = {
+    'K8S-Token': 'fake-token',
+    'K8S-Endpoint': 'https://k8s.fake',
+    'K8S-Verify-Ssl': 'false',
+}
+
+
+@patch('volume_provider.providers.k8s.ApiClient')
+class ClientPoolTestCase(TestCase):
+
+    def setUp(self):
+        CLIENTS.clear()
+
+    def tearDown(self):
+        CLIENTS.clear()
+
+    def test_client_reused(self, api_client):
+        client = ProviderK8s(ENVIRONMENT, dict(AUTH_INFO)).client
+
+        self.assertIs(ProviderK8s(ENVIRONMENT, dict(AUTH_INFO)).client, client)
+        self.assertEqual(api_client.call_count, 1)
+
+    def test_client_per_token(self, api_client):
+        api_client.side_effect = lambda configuration: MagicMock()
+        client = ProviderK8s(ENVIRONMENT, dict(AUTH_INFO)).client
+        auth_info = dict(AUTH_INFO, **{'K8S-Token': 'other-token'})
+
+        self.assertIsNot(ProviderK8s(ENVIRONMENT, auth_info).client, client)
+        self.assertEqual(api_client.call_count, 2)
+
+    def test_evicted_client_closed(self, api_client):
+        ProviderK8s(ENVIRONMENT, dict(AUTH_INFO)).client
+        CLIENTS.clear()
+
+        api_client.return_value.close.assert_called_once_with()
@@ -0,0 +1,51 @@
+from unittest import TestCase
+from unittest.mock import patch, MagicMock
+
+from volume_provider.utils import cache
+from volume_provider.utils.cache import LocalCache
+
+
+class LocalCacheTestCase(TestCase):
+
+    def setUp(self):
+        self.evicted = []
+        self.cache = LocalCache(
+            'test_cache', maxsize=2, ttl=60, on_evict=self.evicted.append
+        )
+
+    def test_get_or_create_reuses_value(self):
+        factory = MagicMock(return_value='client')
+        key = ('gce', 'dev', 'abc')
+
+        self.assertEqual(self.cache.get_or_create(key, factory), 'client')
+        self.assertEqual(self.cache.get_or_create(key, factory), 'client')
+        self.assertEqual(factory.call_count, 1)
+        self.assertEqual(self.cache.hits, 1)
+        self.assertEqual(self.cache.misses, 1)
+
+    def test_lru_eviction(self):
+        self.cache.set(('gce', 'dev', 1), 'one')
+        self.cache.set(('gce', 'dev', 2), 'two')
+        self.cache.get(('gce', 'dev', 1))
+        self.cache.set(('gce', 'dev', 3), 'three')
+
+        self.assertEqual(self.evicted, ['two'])
+        self.assertEqual(self.cache.get(('gce', 'dev', 1)), 'one')
+        self.assertIsNone(self.cache.get(('gce', 'dev', 2)))
+
+    @patch('volume_provider.utils.cache.time')
+    def test_ttl_eviction(self, time_mock):
+        time_mock.return_value = 100
+        self.cache.set(('gce', 'dev', 1), 'one')
+        time_mock.return_value = 161
+
+        self.assertIsNone(self.cache.get(('gce', 'dev', 1)))
+        self.assertEqual(self.evicted, ['one'])
+
+    def test_invalidate_by_environment(self):
+        self.cache.set(('gce', 'dev', 1), 'dev')
+        self.cache.set(('gce', 'prod', 1), 'prod')
+        cache.invalidate('gce', 'dev')
+
+        self.assertIsNone(self.cache.get(('gce', 'dev', 1)))
+        self.assertEqual(self.cache.get(('gce', 'prod', 1)), 'prod')
@@ -0,0 +1,71 @@
+import json
+import os
+from shutil import rmtree
+from tempfile import mkdtemp
+from unittest import TestCase
+from unittest.mock import patch, MagicMock
+
+from volume_provider.utils import discovery
+
+
+FAKE_DOCUMENT = {'rootUrl': 'https://fake/', 'servicePath': 'compute/v1/'}
+
+
+class DiscoveryDocumentTestCase(TestCase):
+
+    def setUp(self):
+        self.path = mkdtemp()
+        self.patch_path = patch(
+            'volume_provider.utils.discovery.GCE_DISCOVERY_PATH', self.path
+        )
+        self.patch_path.start()
+        discovery._documents.clear()
+        self.http = MagicMock()
+        self.http.request.return_value = (
+            MagicMock(status=200), json.dumps(FAKE_DOCUMENT).encode('utf-8')
+        )
+
+    def tearDown(self):
+        self.patch_path.stop()
+        discovery._documents.clear()
+        rmtree(self.path)
+
+    def test_download_and_store_when_missing(self):
+        document = discovery.get_document('compute', 'v1', lambda: self.http)
+
+        self.assertEqual(document, FAKE_DOCUMENT)
+        self.assertTrue(os.path.exists(
+            os.path.join(self.path, 'compute.v1.json')
+        ))
+
+    def test_loaded_once_per_process(self):
+        build_http = MagicMock(return_value=self.http)
+        first = discovery.get_document('compute', 'v1', build_http)
+        second = discovery.get_document('compute', 'v1', build_http)
+
+        self.assertIs(first, second)
+        self.assertEqual(self.http.request.call_count, 1)
+
+    def test_read_from_disk(self):
+        discovery.save_document('compute', 'v1', json.dumps(FAKE_DOCUMENT))
+        build_http = MagicMock()
+
+        document = discovery.get_document('compute', 'v1', build_http)
+
+        self.assertEqual(document, FAKE_DOCUMENT)
+        self.assertFalse(build_http.called)
+
+    def test_refresh(self):
+        discovery.save_document('compute', 'v1', json.dumps({'old': True}))
+        discovery.get_document('compute', 'v1', MagicMock())
+
+        discovery.refresh_document('compute', 'v1', lambda: self.http)
+
+        self.assertEqual(
+            discovery.get_document('compute', 'v1', MagicMock()), FAKE_DOCUMENT
+        )
+
+    def test_download_error(self):
+        self.http.request.return_value = (MagicMock(status=404), b'')
+        with self.assertRaises(EnvironmentError):
+            discovery.get_document('compute', 'v1', lambda: self.http)
@@ -0,0 +1,107 @@
+from datetime import datetime, timedelta
+from unittest import TestCase
+from unittest.mock import patch, MagicMock
+
+from bson import ObjectId
+
+from volume_provider.models import Operation
+from volume_provider.utils import operations
+
+
+@patch('volume_provider.utils.operations.Operation.save', new=MagicMock())
+class OperationTestCase(TestCase):
+
+    def setUp(self):
+        self.provider = MagicMock(provider='gce', environment='dev')
+        self.operation = Operation(
+            provider='gce', environment='dev', action='resize'
+        )
+
+    def test_success(self):
+        call = MagicMock(return_value=MagicMock(identifier='disk-1'))
+        operations.run(
+            self.operation, self.provider, call,
+            lambda volume: {'identifier': volume.identifier},
+            ('fake_id',), {'zone': 'zone-a'}
+        )
+
+        call.assert_called_once_with('fake_id', zone='zone-a')
+        self.assertEqual(self.operation.status, Operation.SUCCESS)
+        self.assertEqual(self.operation.result, {'identifier': 'disk-1'})
+        self.assertIsNotNone(self.operation.started_at)
+        self.assertIsNotNone(self.operation.finished_at)
+        self.provider.release.assert_called_once_with()
+
+    def test_error(self):
+        call = MagicMock(side_effect=Exception('Disk not found'))
+        operations.run(self.operation, self.provider, call, None, (), {})
+
+        self.assertEqual(self.operation.status, Operation.ERROR)
+        self.assertEqual(self.operation.error, 'Disk not found')
+        self.assertTrue(self.operation.finished)
+        self.provider.release.assert_called_once_with()
+
+    @patch('volume_provider.utils.operations._ensure_heartbeat', new=MagicMock())
+    @patch('volume_provider.utils.operations._executor')
+    def test_start_submits_pending_operation(self, executor):
+        call = MagicMock()
+        operation = operations.start(self.provider, 'resize', call, None, 'fake_id', 10)
+
+        self.assertEqual(operation.status, Operation.PENDING)
+        self.assertEqual(operation.provider, 'gce')
+        self.assertEqual(operation.owner, operations.owner())
+        self.assertIsNotNone(operation.heartbeat_at)
+        executor.submit.assert_called_once_with(
+            operations.run, operation, self.provider, call, None, ('fake_id', 10), {}
+        )
+        call.assert_not_called()
+
+
+@patch('volume_provider.utils.operations.Operation.reload', new=MagicMock())
+@patch('volume_provider.utils.operations.Operation.objects')
+class ExpireIfStaleTestCase(TestCase):
+
+    def setUp(self):
+        self.operation = Operation(
+            id=ObjectId(), provider='gce', environment='dev', action='resize',
+            status=Operation.RUNNING, owner='host:1', created_at=datetime.utcnow()
+        )
+
+    def test_alive(self, objects):
+        self.operation.heartbeat_at = datetime.utcnow() - timedelta(seconds=10)
+        operations.expire_if_stale(self.operation)
+
+        self.assertFalse(objects.called)
+
+    def test_stale(self, objects):
+        self.operation.heartbeat_at = datetime.utcnow() - timedelta(hours=1)
+        operations.expire_if_stale(self.operation)
+
+        objects.assert_called_once_with(
+            pk=self.operation.pk, status=Operation.RUNNING,
+            heartbeat_at=self.operation.heartbeat_at
+        )
+        update = objects.return_value.update.call_args[1]
+        self.assertEqual(update['set__status'], Operation.ERROR)
+        self.assertIn('host:1', update['set__error'])
+
+    def test_without_heartbeat_uses_created_at(self, objects):
+        self.operation.created_at = datetime.utcnow() - timedelta(hours=1)
+        operations.expire_if_stale(self.operation)
+
+        self.assertTrue(objects.return_value.update.called)
+
+    def test_finished(self, objects):
+        self.operation.status = Operation.SUCCESS
+        self.operation.heartbeat_at = datetime.utcnow() - timedelta(hours=1)
+        operations.expire_if_stale(self.operation)
+
+        self.assertFalse(objects.called)
+
+    def test_heartbeat_of_this_process(self, objects):
+        operations.heartbeat()
+
+        objects.assert_called_once_with(
+            owner=operations.owner(), status__in=(Operation.PENDING, Operation.RUNNING)
+        )
+        self.assertIn('set__heartbeat_at', objects.return_value.update.call_args[1])
@@ -0,0 +1,41 @@
+from unittest import TestCase
+from unittest.mock import patch
+
+from volume_provider.utils import sessions
+from volume_provider.settings import HTTP_RETRIES, HTTP_POOL_SIZE
+
+
+class SessionsTestCase(TestCase):
+
+    def setUp(self):
+        sessions._sessions.clear()
+
+    def tearDown(self):
+        sessions._sessions.clear()
+
+    def test_session_shared_by_name(self):
+        session = sessions.get_session('team_api')
+
+        self.assertIs(sessions.get_session('team_api'), session)
+        self.assertIsNot(sessions.get_session('other'), session)
+
+    @patch('volume_provider.utils.sessions.os.getpid')
+    def test_new_session_after_fork(self, getpid):
+        getpid.return_value = 1
+        session = sessions.get_session('team_api')
+        getpid.return_value = 2
+
+        self.assertIsNot(sessions.get_session('team_api'), session)
+
+    def test_adapter_pool_and_retries(self):
+        adapter = sessions.get_session('team_api').get_adapter('https://fake')
+
+        self.assertEqual(adapter.max_retries.total, HTTP_RETRIES)
+        self.assertEqual(adapter._pool_maxsize, HTTP_POOL_SIZE)
+
+    def test_stats(self):
+        sessions.get_session('team_api')
+
+        self.assertEqual(sessions.stats(), {
+            'team_api': {'requests': 0, 'connections': 0, 'reused': 0}
+        })
@@ -0,0 +1,50 @@
+from threading import Event
+from unittest import TestCase
+from unittest.mock import patch, MagicMock
+
+from volume_provider.utils import metrics
+from volume_provider.utils.wait import wait_for, WaitTimeout, WaitCancelled
+
+
+@patch('volume_provider.utils.wait.sleep')
+class WaitForTestCase(TestCase):
+
+    def setUp(self):
+        metrics.reset()
+
+    def test_first_probe_without_sleep(self, sleep):
+        probe = MagicMock(return_value='done')
+
+        self.assertEqual(wait_for(probe, 'fake', timeout=10), 'done')
+        sleep.assert_not_called()
+        histogram = metrics.snapshot()['histograms']['wait.fake']
+        self.assertEqual(histogram['count'], 1)
+
+    def test_exponential_backoff(self, sleep):
+        probe = MagicMock(side_effect=[None, None, None, 'done'])
+
+        wait_for(probe, 'fake', timeout=60, initial_delay=1, max_delay=3, jitter=0)
+        self.assertEqual([c[0][0] for c in sleep.call_args_list], [1, 2, 3])
+
+    def test_name_from_result(self, sleep):
+        wait_for(lambda: {'type': 'insert'}, lambda r: 'op.{}'.format(r['type']), timeout=1)
+
+        self.assertIn('wait.op.insert', metrics.snapshot()['histograms'])
+
+    @patch('volume_provider.utils.wait.monotonic')
+    def test_deadline(self, monotonic, sleep):
+        monotonic.side_effect = [0, 4, 11]
+        probe = MagicMock(return_value=None)
+
+        with self.assertRaises(WaitTimeout):
+            wait_for(probe, 'fake', timeout=10, initial_delay=1, jitter=0)
+        self.assertEqual(probe.call_count, 2)
+        self.assertEqual(metrics.snapshot()['counters']['wait.fake.timeout'], 1)
+
+    def test_cancel(self, sleep):
+        cancel = Event()
+        cancel.set()
+
+        with self.assertRaises(WaitCancelled):
+            wait_for(lambda: None, 'fake', timeout=10, cancel=cancel)
+        sleep.assert_not_called()
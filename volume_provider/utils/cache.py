@@ -0,0 +1,217 @@
+import logging
+from collections import OrderedDict
+from threading import RLock, Thread
+from time import time
+
+from volume_provider.utils import metrics
+
+
+LOG = logging.getLogger(__name__)
+_caches = []
+
+
+class LocalCache(object):
+    """Per process cache with LRU and TTL eviction.
+
+    Keys are tuples starting with (provider, environment) so entries can be
+    dropped when the credential of that environment changes.
+    """
+
+    def __init__(self, name, maxsize, ttl, on_evict=None):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.on_evict = on_evict
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = RLock()
+        _caches.append(self)
+        metrics.register(name, self.stats)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires_at = entry
+            if expires_at <= time():
+                self._evict(key)
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            if key in self._data:
+                self._evict(key)
+            self._data[key] = (value, time() + self.ttl)
+            while len(self._data) > self.maxsize:
+                self._evict(next(iter(self._data)))
+        return value
+
+    def get_or_create(self, key, factory):
+        value = self.get(key)
+        if value is None:
+            value = self.set(key, factory())
+        return value
+
+    def invalidate(self, *prefix):
+        with self._lock:
+            for key in list(self._data):
+                if key[:len(prefix)] == prefix:
+                    self._evict(key)
+
+    def clear(self):
+        self.invalidate()
+
+    def _evict(self, key):
+        value, _ = self._data.pop(key)
+        self.evictions += 1
+        if self.on_evict:
+            self.on_evict(value)
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'ttl': self.ttl,
+        }
+
+
+class StaleCache(LocalCache):
+    """LocalCache that keeps serving entries older than fresh_ttl, up to ttl,
+    while they are reloaded in background.
+    """
+
+    def __init__(self, name, maxsize, fresh_ttl, ttl):
+        super(StaleCache, self).__init__(name, maxsize, ttl)
+        self.fresh_ttl = fresh_ttl
+        self.stale_hits = 0
+        self.refresh_errors = 0
+        self._refreshing = set()
+
+    def get_or_load(self, key, loader):
+        value = self.get(key)
+        if value is None:
+            return self.set(key, loader())
+
+        with self._lock:
+            _, expires_at = self._data.get(key, (None, 0))
+        if expires_at - self.ttl + self.fresh_ttl <= time():
+            self.stale_hits += 1
+            self._refresh(key, loader)
+        return value
+
+    def _refresh(self, key, loader):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+        Thread(target=self._reload, args=(key, loader), daemon=True).start()
+
+    def _reload(self, key, loader):
+        try:
+            self.set(key, loader())
+        except Exception as e:
+            self.refresh_errors += 1
+            LOG.warning('Could not refresh %s on %s: %s', key, self.name, e)
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def stats(self):
+        stats = super(StaleCache, self).stats()
+        stats.update({
+            'stale_hits': self.stale_hits,
+            'refresh_errors': self.refresh_errors,
+            'fresh_ttl': self.fresh_ttl,
+        })
+        return stats
+
+
+class Pool(object):
+    """Idle objects per key, each one is lent to a single request at a time.
+
+    Keys follow LocalCache, starting with (provider, environment).
+    """
+
+    def __init__(self, name, maxsize, max_idle, ttl, on_evict=None):
+        self.name = name
+        self.maxsize = maxsize
+        self.max_idle = max_idle
+        self.ttl = ttl
+        self.on_evict = on_evict
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._idle = OrderedDict()
+        self._lock = RLock()
+        _caches.append(self)
+        metrics.register(name, self.stats)
+
+    def acquire(self, key, factory):
+        with self._lock:
+            idle = self._idle.get(key, [])
+            while idle:
+                value, expires_at = idle.pop()
+                if expires_at > time():
+                    self.hits += 1
+                    return value
+                self._evict(value)
+            self.misses += 1
+        return factory()
+
+    def release(self, key, value):
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            self._idle.move_to_end(key)
+            if len(idle) < self.max_idle:
+                idle.append((value, time() + self.ttl))
+            else:
+                self._evict(value)
+            while len(self._idle) > self.maxsize:
+                _, values = self._idle.popitem(last=False)
+                for old_value, _ in values:
+                    self._evict(old_value)
+
+    def invalidate(self, *prefix):
+        with self._lock:
+            for key in list(self._idle):
+                if key[:len(prefix)] == prefix:
+                    for value, _ in self._idle.pop(key):
+                        self._evict(value)
+
+    def clear(self):
+        self.invalidate()
+
+    def _evict(self, value):
+        self.evictions += 1
+        if self.on_evict:
+            self.on_evict(value)
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'idle': sum(len(values) for values in self._idle.values()),
+            'keys': len(self._idle),
+            'max_idle': self.max_idle,
+            'ttl': self.ttl,
+        }
+
+
+def invalidate(provider, environment):
+    for cache in _caches:
+        cache.invalidate(provider, environment)
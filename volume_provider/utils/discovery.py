@@ -0,0 +1,72 @@
+import json
+import logging
+import os
+from threading import Lock
+
+from googleapiclient.discovery import DISCOVERY_URI
+
+from volume_provider.settings import GCE_DISCOVERY_PATH
+
+
+LOG = logging.getLogger(__name__)
+
+_documents = {}
+_lock = Lock()
+
+
+def document_path(api, version):
+    return os.path.join(GCE_DISCOVERY_PATH, '{}.{}.json'.format(api, version))
+
+
+def fetch_document(http, api, version):
+    url = DISCOVERY_URI.format(api=api, apiVersion=version)
+    resp, content = http.request(url)
+    if resp.status >= 400:
+        raise EnvironmentError('Could not download discovery document {} - {}'.format(
+            url, resp.status
+        ))
+    if isinstance(content, bytes):
+        content = content.decode('utf-8')
+    return content
+
+
+def save_document(api, version, content):
+    path = document_path(api, version)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = '{}.tmp'.format(path)
+    with open(tmp_path, 'w') as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+    return path
+
+
+def get_document(api, version, build_http):
+    """Parsed discovery document, loaded once per process.
+
+    It is read from GCE_DISCOVERY_PATH and only downloaded, and stored there,
+    when the file does not exist yet.
+    """
+    key = (api, version)
+    with _lock:
+        if key not in _documents:
+            path = document_path(api, version)
+            if os.path.exists(path):
+                with open(path) as f:
+                    content = f.read()
+            else:
+                content = fetch_document(build_http(), api, version)
+                try:
+                    save_document(api, version, content)
+                except OSError as e:
+                    LOG.warning('Could not store discovery document at %s: %s', path, e)
+            _documents[key] = json.loads(content)
+        return _documents[key]
+
+
+def refresh_document(api, version, build_http):
+    content = fetch_document(build_http(), api, version)
+    document = json.loads(content)
+    path = save_document(api, version, content)
+    with _lock:
+        _documents[(api, version)] = document
+    return path
@@ -0,0 +1,67 @@
+from bisect import bisect_left
+from collections import defaultdict
+from threading import Lock
+
+
+BUCKETS = (0.5, 1, 2, 5, 10, 30, 60, 120, 300, 600, 1800)
+
+_lock = Lock()
+_counters = defaultdict(int)
+_histograms = {}
+_sources = {}
+
+
+def incr(name, value=1):
+    with _lock:
+        _counters[name] += value
+
+
+def observe(name, value):
+    """Adds value, usually seconds, to the histogram name using BUCKETS"""
+    with _lock:
+        histogram = _histograms.get(name)
+        if histogram is None:
+            histogram = _histograms[name] = {
+                'count': 0, 'sum': 0.0, 'max': 0.0,
+                'buckets': [0] * (len(BUCKETS) + 1),
+            }
+        histogram['count'] += 1
+        histogram['sum'] += value
+        histogram['max'] = max(histogram['max'], value)
+        histogram['buckets'][bisect_left(BUCKETS, value)] += 1
+
+
+def register(name, source):
+    _sources[name] = source
+
+
+def _histogram_json(histogram):
+    buckets = {}
+    for bound, count in zip(BUCKETS + ('+Inf',), histogram['buckets']):
+        buckets[str(bound)] = count
+    return {
+        'count': histogram['count'],
+        'sum': histogram['sum'],
+        'max': histogram['max'],
+        'buckets': buckets,
+    }
+
+
+def snapshot():
+    with _lock:
+        data = {
+            'counters': dict(_counters),
+            'histograms': {
+                name: _histogram_json(histogram)
+                for name, histogram in _histograms.items()
+            },
+        }
+    for name, source in list(_sources.items()):
+        data[name] = source()
+    return data
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
@@ -0,0 +1,120 @@
+import logging
+import os
+import socket
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from threading import Lock, Thread
+from time import sleep
+
+from volume_provider.models import Operation
+from volume_provider.settings import (
+    OPERATION_WORKERS, OPERATION_HEARTBEAT_INTERVAL, OPERATION_STALE_TIMEOUT
+)
+from volume_provider.utils import metrics
+
+
+LOG = logging.getLogger(__name__)
+_executor = ThreadPoolExecutor(max_workers=OPERATION_WORKERS)
+_heartbeat_lock = Lock()
+_heartbeat_pid = None
+
+
+def owner():
+    return '{}:{}'.format(socket.gethostname(), os.getpid())
+
+
+def start(provider, action, call, serializer=None, *args, **kwargs):
+    """Persists a new Operation and runs call in background.
+
+    The provider is released when the call finishes, and serializer turns
+    the call return into the operation result.
+    """
+    now = datetime.utcnow()
+    operation = Operation(
+        provider=provider.provider,
+        environment=provider.environment,
+        action=action,
+        created_at=now,
+        owner=owner(),
+        heartbeat_at=now
+    )
+    operation.save()
+    _ensure_heartbeat()
+    metrics.incr('operations.started')
+    _executor.submit(run, operation, provider, call, serializer, args, kwargs)
+    return operation
+
+
+def run(operation, provider, call, serializer, args, kwargs):
+    try:
+        operation.status = Operation.RUNNING
+        operation.started_at = datetime.utcnow()
+        operation.save()
+
+        result = call(*args, **kwargs)
+        operation.result = serializer(result) if serializer else {}
+        operation.status = Operation.SUCCESS
+    except Exception as e:
+        LOG.exception('Operation %s (%s) failed', operation.uuid, operation.action)
+        operation.error = str(e)
+        operation.status = Operation.ERROR
+    finally:
+        operation.finished_at = datetime.utcnow()
+        try:
+            operation.save()
+        except Exception:
+            LOG.exception('Could not save operation %s', operation.uuid)
+        provider.release()
+    metrics.incr('operations.{}'.format(operation.status))
+    return operation
+
+
+def _ensure_heartbeat():
+    global _heartbeat_pid
+    with _heartbeat_lock:
+        if _heartbeat_pid == os.getpid():
+            return
+        _heartbeat_pid = os.getpid()
+    Thread(target=_beat, daemon=True).start()
+
+
+def _beat():
+    while True:
+        sleep(OPERATION_HEARTBEAT_INTERVAL)
+        try:
+            heartbeat()
+        except Exception:
+            LOG.exception('Could not record the heartbeat of operations')
+
+
+def heartbeat():
+    """Tells the unfinished operations of this process are still alive"""
+    return Operation.objects(
+        owner=owner(), status__in=(Operation.PENDING, Operation.RUNNING)
+    ).update(set__heartbeat_at=datetime.utcnow())
+
+
+def expire_if_stale(operation):
+    """Marks as error an unfinished operation whose process stopped its
+    heartbeat, as after a restart or deploy the work will never finish.
+    """
+    if operation.finished:
+        return operation
+    last_seen = operation.heartbeat_at or operation.created_at
+    if datetime.utcnow() - last_seen < timedelta(seconds=OPERATION_STALE_TIMEOUT):
+        return operation
+
+    expired = Operation.objects(
+        pk=operation.pk, status=operation.status, heartbeat_at=operation.heartbeat_at
+    ).update(
+        set__status=Operation.ERROR,
+        set__error='Operation lost, {} stopped before it finished'.format(operation.owner),
+        set__finished_at=datetime.utcnow()
+    )
+    if expired:
+        LOG.warning(
+            'Operation %s (%s) lost by %s', operation.uuid, operation.action, operation.owner
+        )
+        metrics.incr('operations.lost')
+    operation.reload()
+    return operation
@@ -0,0 +1,68 @@
+import os
+from threading import Lock
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from volume_provider.settings import HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT, HTTP_RETRIES, \
+    HTTP_POOL_SIZE
+from volume_provider.utils import metrics
+
+
+TIMEOUT = (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)
+
+_sessions = {}
+_lock = Lock()
+
+
+def build_session():
+    retry = Retry(
+        total=HTTP_RETRIES,
+        backoff_factor=0.3,
+        status_forcelist=(502, 503, 504),
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(
+        pool_connections=HTTP_POOL_SIZE,
+        pool_maxsize=HTTP_POOL_SIZE,
+        max_retries=retry
+    )
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def get_session(name):
+    """Keep-alive session shared by every request of this worker"""
+    key = (os.getpid(), name)
+    with _lock:
+        if key not in _sessions:
+            _sessions[key] = build_session()
+        return _sessions[key]
+
+
+def stats():
+    data = {}
+    for (pid, name), session in list(_sessions.items()):
+        if pid != os.getpid():
+            continue
+        requests_count = connections = 0
+        for adapter in set(session.adapters.values()):
+            pools = adapter.poolmanager.pools
+            for pool_key in list(pools.keys()):
+                pool = pools.get(pool_key)
+                if pool is None:
+                    continue
+                requests_count += pool.num_requests
+                connections += pool.num_connections
+        data[name] = {
+            'requests': requests_count,
+            'connections': connections,
+            'reused': requests_count - connections,
+        }
+    return data
+
+
+metrics.register('http_sessions', stats)
@@ -0,0 +1,57 @@
+import logging
+from random import uniform
+from time import sleep, monotonic
+
+from volume_provider.settings import WAIT_INITIAL_DELAY, WAIT_MAX_DELAY
+from volume_provider.utils import metrics
+
+
+LOG = logging.getLogger(__name__)
+
+
+class WaitTimeout(EnvironmentError):
+    pass
+
+
+class WaitCancelled(EnvironmentError):
+    pass
+
+
+def wait_for(probe, name, timeout, initial_delay=WAIT_INITIAL_DELAY,
+             max_delay=WAIT_MAX_DELAY, factor=2, jitter=0.2, cancel=None):
+    """Calls probe until it returns a truthy value and returns that value.
+
+    The first probe is done right away, the following ones after an
+    exponential backoff with jitter, capped by max_delay and by the timeout
+    deadline. cancel is an optional threading.Event that stops the wait.
+    The time taken is recorded on the histogram 'wait.<name>', name may be
+    a callable that builds it from the probe result.
+    """
+    started = monotonic()
+    deadline = started + timeout
+    delay = initial_delay
+    attempt = 0
+    while True:
+        attempt += 1
+        result = probe()
+        if result:
+            if callable(name):
+                name = name(result)
+            metrics.observe('wait.{}'.format(name), monotonic() - started)
+            return result
+
+        remaining = deadline - monotonic()
+        if remaining <= 0:
+            name = name(None) if callable(name) else name
+            metrics.incr('wait.{}.timeout'.format(name))
+            raise WaitTimeout('Timeout after {:.0f}s and {} attempts waiting {}'.format(
+                timeout, attempt, name
+            ))
+
+        pause = min(delay, max_delay)
+        pause = min(pause + uniform(-jitter, jitter) * pause, remaining)
+        if cancel is None:
+            sleep(pause)
+        elif cancel.wait(pause):
+            raise WaitCancelled('Cancelled waiting {}'.format(name))
+        delay *= factor